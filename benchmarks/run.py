@@ -0,0 +1,389 @@
+"""
+Benchmarks for the analysis hot paths, on synthetic flame footage.
+
+    python benchmarks/run.py --sizes 1280x720,1920x1080 --frames 120 --save baseline.json
+    python benchmarks/run.py --sizes 1280x720,1920x1080 --frames 120 --compare baseline.json
+
+Every stage reports frames/s, the latency of one call (one frame, or one
+chunk for the chunked stages) and the peak memory traced while it ran.
+With --compare, a stage that got slower or uses more memory than the
+baseline by more than --tolerance fails the run.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from collections import namedtuple
+
+import numpy as np
+from pims import ImageSequence
+from skimage.color import rgb2hsv
+
+from napari_ros._reader import reader_function
+from napari_ros._video import iterVideoFrames
+from napari_ros.analyze.HSVMask.HSVMaskAnalyzer import HSVMaskAnalyzer
+from napari_ros.analyze.HSVMask.flameMask import getFlameMask
+from napari_ros.analyze.HSVMask.frontTracking import FrontTracker
+from napari_ros.analyze.HSVMask.batchAnalysis import analyzeInput
+from napari_ros.analyze.HSVMask.postProcess import postProcess
+from napari_ros.analyze.HSVMask.resultStore import ResultStore
+
+from synthetic import (
+    getBenchmarkConfig,
+    iterFlameFrames,
+    writeFlameImageSequence,
+    writeFlameVideo,
+)
+
+# Everything a stage needs for one resolution
+Context = namedtuple(
+    "Context", ["shape", "frames", "videoPath", "imageSequenceDir", "config", "analyzer", "workDir"]
+)
+
+# Rows of results postProcess gets, per benchmark frame
+POST_PROCESS_ROWS_PER_FRAME = 100
+
+
+def stageFlameMaskRgb2hsv(context):
+    """
+    The original mask: skimage's rgb2hsv on the whole frame, then thresholds
+    """
+    h, s, v = context.config["h"], context.config["s"], context.config["v"]
+    calls = [lambda frame=frame: getFlameMask(h, s, v, rgb2hsv(frame)) for frame in context.frames]
+    return calls, len(context.frames)
+
+
+def stageGetMask(context):
+    h, s, v = context.config["h"], context.config["s"], context.config["v"]
+    calls = [lambda frame=frame: context.analyzer.getMask(h, s, v, frame) for frame in context.frames]
+    return calls, len(context.frames)
+
+
+def stageCompletelyAnalyzeFrame(context):
+    config = context.config
+    calls = [
+        lambda frame=frame: context.analyzer.completelyAnalyzeFrame(
+            frame, config["crop"], config["secondCropBox"], config["mirror"], config["h"], config["s"], config["v"]
+        )
+        for frame in context.frames
+    ]
+    return calls, len(context.frames)
+
+
+def stageAnalyzeFrames(context):
+    chunkSize = context.config["chunkSize"]
+    chunks = [
+        np.stack(context.frames[start : start + chunkSize])
+        for start in range(0, len(context.frames), chunkSize)
+    ]
+    calls = [lambda chunk=chunk: context.analyzer.analyzeFrames(chunk, context.config) for chunk in chunks]
+    return calls, len(context.frames)
+
+
+def stageCoarseToFine(context):
+    """
+    analyzeFrames chunks with the coarse pass picking the tiles to threshold
+    """
+    chunkSize = context.config["chunkSize"]
+    config = {**context.config, "coarseToFine": True}
+    chunks = [
+        np.stack(context.frames[start : start + chunkSize])
+        for start in range(0, len(context.frames), chunkSize)
+    ]
+    calls = [lambda chunk=chunk: context.analyzer.analyzeFrames(chunk, config) for chunk in chunks]
+    return calls, len(context.frames)
+
+
+def stageFrontTracking(context):
+    """
+    analyzeFrames chunks through one FrontTracker, like the serial analysis
+    """
+    chunkSize = context.config["chunkSize"]
+    chunks = [
+        np.stack(context.frames[start : start + chunkSize])
+        for start in range(0, len(context.frames), chunkSize)
+    ]
+    config = {**context.config, "frontTracking": True}
+    tracker = None
+
+    def analyzeChunk(index):
+        nonlocal tracker
+        # The tracker keeps the band between chunks, so every pass over
+        # the calls (the warm-up too) starts again with a new one
+        if index == 0:
+            tracker = FrontTracker(context.analyzer, config)
+        return tracker.analyzeFrames(chunks[index])
+
+    calls = [lambda index=index: analyzeChunk(index) for index in range(len(chunks))]
+    return calls, len(context.frames)
+
+
+def stageVideoDecode(context):
+    return [lambda: sum(1 for _ in iterVideoFrames(context.videoPath))], len(context.frames)
+
+
+def stageReaderSlicing(context):
+    """
+    Chunks of the reader's dask array, computed in order like napari playing
+    """
+    array = reader_function(context.videoPath)[0][0]
+    chunkSize = array.chunksize[0]
+    calls = [
+        lambda start=start: array[start : start + chunkSize].compute(scheduler="synchronous")
+        for start in range(0, array.shape[0], chunkSize)
+    ]
+    return calls, array.shape[0]
+
+
+def stageImageSequenceRead(context):
+    images = ImageSequence(context.imageSequenceDir)
+    calls = [lambda index=index: np.asarray(images[index]) for index in range(len(images))]
+    return calls, len(images)
+
+
+def stageAnalyzeInput(context):
+    """
+    The whole Analyze button run on the video, post processing included
+    """
+    def run():
+        # Start over instead of resuming from the last run's checkpoint
+        shutil.rmtree(os.path.join(context.workDir, "data"), ignore_errors=True)
+        for _ in analyzeInput(context.videoPath, context.config, "benchmark"):
+            pass
+
+    return [run], len(context.frames)
+
+
+def stagePostProcess(context):
+    rows = len(context.frames) * POST_PROCESS_ROWS_PER_FRAME
+    frames = np.arange(rows)
+    front = np.clip(frames - rows // 10, 0, None) * context.shape[1] // rows
+    zeros = np.zeros(rows, dtype=np.int64)
+
+    results = ResultStore()
+    results.append(
+        {
+            "highestXPos": front,
+            "lowestXPos": zeros,
+            "boundingBoxWithSecondCropBox": np.stack([zeros, zeros, zeros, front], axis=1),
+            "flameTipCoordinates": np.stack([front, zeros], axis=1),
+        }
+    )
+
+    exportDir = os.path.join(context.workDir, "postProcess")
+    os.makedirs(exportDir, exist_ok=True)
+
+    return [lambda: postProcess(results, context.config, "benchmark", exportDir)], rows
+
+
+STAGES = {
+    "flameMaskRgb2hsv": stageFlameMaskRgb2hsv,
+    "getMask": stageGetMask,
+    "completelyAnalyzeFrame": stageCompletelyAnalyzeFrame,
+    "analyzeFrames": stageAnalyzeFrames,
+    "coarseToFine": stageCoarseToFine,
+    "frontTracking": stageFrontTracking,
+    "videoDecode": stageVideoDecode,
+    "readerSlicing": stageReaderSlicing,
+    "imageSequenceRead": stageImageSequenceRead,
+    "analyzeInput": stageAnalyzeInput,
+    "postProcess": stagePostProcess,
+}
+
+
+def runCalls(calls):
+    latencies = []
+
+    # Keep the stages' progress prints out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for call in calls:
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def measureStage(stage, context, traceMemory: bool):
+    """
+    Time the stage, then run it again under tracemalloc for its peak memory
+    (tracing slows it down, so it isn't timed)
+    """
+    calls, frameCount = stage(context)
+
+    # Warm up caches and allocators on the first call when there are several
+    if len(calls) > 1:
+        runCalls(calls[:1])
+
+    latencies = np.array(runCalls(calls))
+
+    result = {
+        "frames": frameCount,
+        "framesPerSecond": frameCount / latencies.sum(),
+        "latencyMsMedian": float(np.median(latencies) * 1000),
+        "latencyMsP95": float(np.percentile(latencies, 95) * 1000),
+    }
+
+    if traceMemory:
+        calls, _ = stage(context)
+        tracemalloc.start()
+        try:
+            runCalls(calls)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result["peakMemoryMb"] = peak / 1024**2
+
+    return result
+
+
+def prepareContext(shape, frameCount: int, dataDir: str, analyzer: HSVMaskAnalyzer):
+    """
+    Generate (or reuse) the synthetic video and image sequence for shape
+    """
+    name = f"flame_{shape[1]}x{shape[0]}_{frameCount}"
+    workDir = os.path.join(dataDir, name)
+    os.makedirs(workDir, exist_ok=True)
+
+    videoPath = os.path.join(workDir, f"{name}.mp4")
+    if not os.path.exists(videoPath):
+        writeFlameVideo(videoPath + ".tmp.mp4", shape, frameCount)
+        os.replace(videoPath + ".tmp.mp4", videoPath)
+
+    imageSequenceDir = os.path.join(workDir, "images")
+    if len(os.listdir(imageSequenceDir) if os.path.isdir(imageSequenceDir) else []) != frameCount:
+        shutil.rmtree(imageSequenceDir, ignore_errors=True)
+        writeFlameImageSequence(imageSequenceDir, shape, frameCount)
+
+    return Context(
+        shape=shape,
+        frames=list(iterFlameFrames(shape, frameCount)),
+        videoPath=videoPath,
+        imageSequenceDir=imageSequenceDir,
+        config=getBenchmarkConfig(shape),
+        analyzer=analyzer,
+        workDir=workDir,
+    )
+
+
+def compareToBaseline(results: dict, baseline: dict, tolerance: float):
+    """
+    Returns the regressions, as printable lines
+    """
+    regressions = []
+
+    for key, result in results.items():
+        expected = baseline["results"].get(key)
+        if expected is None:
+            continue
+
+        if result["framesPerSecond"] < expected["framesPerSecond"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: {result['framesPerSecond']:.1f} frames/s, baseline {expected['framesPerSecond']:.1f}"
+            )
+
+        # Small stages are dominated by noise, allow a few MB either way
+        if (
+            "peakMemoryMb" in result
+            and "peakMemoryMb" in expected
+            and result["peakMemoryMb"] > expected["peakMemoryMb"] * (1 + tolerance) + 4
+        ):
+            regressions.append(
+                f"{key}: {result['peakMemoryMb']:.1f} MB peak, baseline {expected['peakMemoryMb']:.1f}"
+            )
+
+    return regressions
+
+
+def parseSize(size: str):
+    width, height = (int(value) for value in size.lower().split("x"))
+    return height, width
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="640x360,1280x720,1920x1080", help="comma separated WIDTHxHEIGHT")
+    parser.add_argument("--frames", type=int, default=60, help="frames per synthetic video")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma separated, from: " + ", ".join(STAGES))
+    parser.add_argument("--data-dir", help="where the synthetic footage is kept (default: a temporary directory)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--save", help="write the results to this JSON file, to use as a baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression, as a fraction (default 0.25)")
+    args = parser.parse_args(argv)
+
+    # pims and skimage warn on every image read
+    warnings.simplefilter("ignore")
+
+    stageNames = args.stages.split(",")
+    unknownStages = set(stageNames) - set(STAGES)
+    if unknownStages:
+        parser.error(f"unknown stages {sorted(unknownStages)}")
+
+    dataDir = args.data_dir or tempfile.mkdtemp(prefix="napari-ros-benchmarks-")
+    analyzer = HSVMaskAnalyzer()
+
+    # Table building and compiling are one time costs, keep them out of the numbers
+    analyzer.getHsvLookup()
+
+    results = {}
+    for size in args.sizes.split(","):
+        shape = parseSize(size)
+        print(f"preparing {size}, {args.frames} frames", flush=True)
+        context = prepareContext(shape, args.frames, dataDir, analyzer)
+        analyzer.getFlameTable(context.config["h"], context.config["s"], context.config["v"])
+        analyzer.getFlameValues(context.config["h"], context.config["s"], context.config["v"])
+
+        for stageName in stageNames:
+            result = measureStage(STAGES[stageName], context, not args.no_memory)
+            key = f"{stageName}@{size}x{args.frames}"
+            results[key] = result
+
+            memory = f"{result['peakMemoryMb']:8.1f} MB" if "peakMemoryMb" in result else ""
+            print(
+                f"  {stageName:24s} {result['framesPerSecond']:10.1f} frames/s"
+                f" {result['latencyMsMedian']:9.2f} ms median {result['latencyMsP95']:9.2f} ms p95 {memory}",
+                flush=True,
+            )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "machine": {
+                        "platform": platform.platform(),
+                        "processor": platform.processor(),
+                        "python": platform.python_version(),
+                        "cpus": os.cpu_count(),
+                    },
+                    "results": results,
+                },
+                f,
+                indent=4,
+            )
+        print(f"saved {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        regressions = compareToBaseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"no regressions against {args.compare}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
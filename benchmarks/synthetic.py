@@ -0,0 +1,127 @@
+"""
+Deterministic synthetic flame footage for the benchmarks.
+
+A bright yellow-white flame (inside the default HSV thresholds) ignites at
+the right edge and spreads left over a dark, noisy plate, with a jagged
+leading edge, like a mirrored burn. The same arguments always give the
+same pixels.
+"""
+import os
+import av
+import numpy as np
+from skimage.io import imsave
+
+# Inside the default thresholds: h ~ 0.12, s ~ 0.41, v = 1
+FLAME_COLOR = np.array([255, 230, 150], dtype=np.uint8)
+
+# Outside them (too saturated), around the flame
+GLOW_COLOR = np.array([255, 140, 40], dtype=np.uint8)
+
+
+def getFlameFront(frameIndex: int, frameCount: int, width: int):
+    """
+    Columns the flame has burnt from the right edge by frameIndex.
+    Nothing for the first 10% of the frames, then a steady spread over
+    80% of the width.
+    """
+    ignitionFrame = frameCount // 10
+    progress = (frameIndex - ignitionFrame) / max(frameCount - ignitionFrame, 1)
+    return int(np.clip(progress, 0, 1) * width * 0.8)
+
+
+def makeFlameFrame(shape, frameIndex: int, frameCount: int, seed: int = 0):
+    """
+    One RGB frame of the burn, shape is (height, width)
+    """
+    height, width = shape
+    rng = np.random.default_rng((seed, frameIndex))
+
+    # Dark plate with sensor noise
+    frame = rng.integers(20, 60, size=(height, width, 3), dtype=np.uint8)
+
+    front = getFlameFront(frameIndex, frameCount, width)
+    if front == 0:
+        return frame
+
+    # The flame covers the lower part of the frame, like the default crop boxes
+    top, bottom = int(height * 0.35), int(height * 0.91)
+
+    # Jagged leading edge, a few percent of the width per row
+    jitter = rng.integers(0, max(width // 40, 1), size=bottom - top)
+    edges = np.clip(width - front + jitter, 0, width)
+
+    columns = np.arange(width)
+    flame = columns[np.newaxis, :] >= edges[:, np.newaxis]
+    glow = (columns[np.newaxis, :] >= edges[:, np.newaxis] - width // 50) & ~flame
+
+    rows = frame[top:bottom]
+    rows[glow] = GLOW_COLOR
+    rows[flame] = FLAME_COLOR
+
+    return frame
+
+
+def iterFlameFrames(shape, frameCount: int, seed: int = 0):
+    for frameIndex in range(frameCount):
+        yield makeFlameFrame(shape, frameIndex, frameCount, seed)
+
+
+def writeFlameVideo(path: str, shape, frameCount: int, fps: int = 60, seed: int = 0):
+    """
+    Encode the burn as an mp4 (MPEG-4 part 2, keyframe every 30 frames)
+    """
+    with av.open(path, "w") as container:
+        stream = container.add_stream("mpeg4", rate=fps)
+        stream.height, stream.width = shape
+        stream.pix_fmt = "yuv420p"
+        stream.options = {"g": "30", "qscale": "2"}
+
+        for image in iterFlameFrames(shape, frameCount, seed):
+            frame = av.VideoFrame.from_ndarray(image, format="rgb24")
+            for packet in stream.encode(frame):
+                container.mux(packet)
+
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def writeFlameImageSequence(directory: str, shape, frameCount: int, seed: int = 0):
+    """
+    Write the burn as DSC_0000.png, DSC_0001.png, ... like a camera would
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    for frameIndex, image in enumerate(iterFlameFrames(shape, frameCount, seed)):
+        imsave(
+            os.path.join(directory, f"DSC_{frameIndex:04d}.png"),
+            image,
+            check_contrast=False,
+        )
+
+
+def getBenchmarkConfig(shape):
+    """
+    The widget's default config, scaled from 1920x1080 to shape
+    """
+    height, width = shape
+
+    def scaleRows(rows):
+        return [round(row * height / 1080) for row in rows]
+
+    def scaleColumns(columns):
+        return [round(column * width / 1920) for column in columns]
+
+    return {
+        "crop": scaleRows([960, 987]) + scaleColumns([511, 1496]),
+        "secondCropBox": scaleRows([360, 987]) + scaleColumns([511, 1496]),
+        "mirror": True,
+        "h": [0.0, 0.32407407407407407],
+        "s": [0.0, 0.6620370370370371],
+        "v": [0.9, 1.0],
+        "pixelsInUnit": 104,
+        "cmApart": 4.5,
+        "fps": 60,
+        "workers": 1,
+        "chunkSize": 16,
+        "exportFormats": [],
+    }
@@ -4,9 +4,19 @@ except ImportError:
     __version__ = "unknown"
 
 from ._reader import napari_get_reader
-from ._widget import ConfigWidget
 
 __all__ = (
     "napari_get_reader",
     "ConfigWidget",
 )
+
+
+def __getattr__(name):
+    # The widget pulls in napari's Qt side, which the command line
+    # and the batch analysis don't need, so only import it when asked for
+    if name == "ConfigWidget":
+        from ._widget import ConfigWidget
+
+        return ConfigWidget
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,9 +5,19 @@ It implements the Reader specification, but your plugin may choose to
 implement multiple readers or even other plugin contributions. see:
 https://napari.org/stable/plugins/guides.html?#readers
 """
-from pims import PyAVReaderTimed, PyAVReaderIndexed
-from dask import delayed
+import os
+from functools import partial
 import dask.array as da
+import numpy as np
+from ._video import (
+    VideoReader,
+    buildPyramid,
+    DEFAULT_CACHE_BYTES,
+    DEFAULT_PREFETCH_FRAMES,
+)
+
+# Frames per dask chunk, each chunk is decoded sequentially in one task
+DEFAULT_CHUNK_SIZE = 8
 
 
 def napari_get_reader(path):
@@ -34,11 +44,31 @@ def napari_get_reader(path):
     if not path.endswith(".mp4"):
         return None
 
+    options = {}
+
+    # Set NAPARI_ROS_MULTISCALE=1 to open videos as a multiscale pyramid
+    if os.environ.get("NAPARI_ROS_MULTISCALE", "0") not in ("", "0"):
+        options["multiscale"] = True
+
+    # NAPARI_ROS_CACHE_BYTES sets the memory budget for decoded frames
+    cacheBytes = os.environ.get("NAPARI_ROS_CACHE_BYTES", "")
+    if cacheBytes:
+        options["cacheBytes"] = int(cacheBytes)
+
+    if options:
+        return partial(reader_function, **options)
+
     # otherwise we return the *function* that can read ``path``.
     return reader_function
 
 
-def reader_function(path):
+def reader_function(
+    path,
+    cacheBytes=DEFAULT_CACHE_BYTES,
+    prefetchFrames=DEFAULT_PREFETCH_FRAMES,
+    chunkSize=DEFAULT_CHUNK_SIZE,
+    multiscale=False,
+):
     """Take a path or list of paths and return a list of LayerData tuples.
 
     Readers are expected to return data as a list of tuples, where each tuple
@@ -49,6 +79,15 @@ def reader_function(path):
     ----------
     path : str or list of str
         Path to file, or list of paths.
+    cacheBytes : int
+        Memory budget for decoded frames kept in the LRU cache.
+    prefetchFrames : int
+        Frames decoded in the background after every requested frame.
+    chunkSize : int
+        Frames per chunk of the returned dask array.
+    multiscale : bool
+        Return a pyramid of lazily downsampled levels, so napari only pulls
+        full resolution frames when zoomed in.
 
     Returns
     -------
@@ -66,26 +105,34 @@ def reader_function(path):
     if len(paths) != 1:
         raise ValueError("ROS reader can only handle a single video file")
 
-    video = PyAVReaderTimed(paths[0])
-
-    # TODO: Get number of frames a better way?
-    frameRate = video.frame_rate
-    duration = video.duration
-    frames = int(frameRate * duration)
-
-    lazy_video = delayed(video)
-    lazy_arrays = [lazy_video[i] for i in range(frames)]
-    arrays = [
-        da.from_delayed(
-            delayed_reader, shape=video.frame_shape, dtype=video.pixel_type
+    # Builds an exact frame index, so the number of frames is exact too
+    video = VideoReader(
+        paths[0], cacheBytes=cacheBytes, prefetchFrames=prefetchFrames
+    )
+
+    levels = buildPyramid(video) if multiscale else [video]
+
+    # One task per chunk of frames instead of one per frame. The reader is
+    # put in the graph once and reopens the file in whichever process
+    # computes the chunk.
+    data = [
+        da.from_array(
+            level,
+            chunks=(chunkSize, *level.frameShape),
+            lock=False,
+            fancy=False,
+            meta=np.empty((0, 0, 0, 0), dtype=np.uint8),
         )
-        for delayed_reader in lazy_arrays
+        for level in levels
     ]
 
-    data = da.stack(arrays, axis=0)
+    # napari needs at least two levels for a multiscale layer
+    multiscale = len(data) > 1
+    if not multiscale:
+        data = data[0]
 
     # optional kwargs for the corresponding viewer.add_* method
-    add_kwargs = {"contrast_limits": [0, 255], "multiscale": False}
+    add_kwargs = {"contrast_limits": [0, 255], "multiscale": multiscale}
 
     layer_type = "image"  # optional, default is "image"
     return [(data, add_kwargs, layer_type)]
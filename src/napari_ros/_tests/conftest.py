@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def lookupCacheDir(tmp_path_factory):
+    """
+    Build the RGB to HSV lookup table once for the whole session.
+    Set in os.environ so worker processes use the same table.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        cacheDir = tmp_path_factory.mktemp("cache")
+        mp.setenv("NAPARI_ROS_CACHE_DIR", str(cacheDir))
+        yield cacheDir
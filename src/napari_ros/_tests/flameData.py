@@ -0,0 +1,60 @@
+"""
+Synthetic flame footage shared by the analysis tests
+"""
+import numpy as np
+from skimage.io import imsave
+
+# Flame settings and crop boxes for the synthetic frames below
+CONFIG = {
+    "crop": [60, 110, 10, 150],
+    "secondCropBox": [20, 110, 10, 150],
+    "mirror": True,
+    "h": [0.0, 0.32407407407407407],
+    "s": [0.0, 0.6620370370370371],
+    "v": [0.9, 1.0],
+}
+
+FLAME_COLOUR = (255, 230, 120)
+
+
+def flameFrames(
+    count=10,
+    shape=(120, 160),
+    ignition=0,
+    burnout=None,
+    right=30,
+    speed=10,
+    width=None,
+    embers=0,
+):
+    """
+    (count, *shape, 3) dark noise with a flame front in rows 40:100 from
+    frame ignition until burnout. Its right edge starts at column right and
+    moves right by speed px per frame, it reaches back to column 20, or
+    width px when given. embers adds that many random flame coloured specks
+    to every frame but the first.
+    """
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 60, (count, *shape, 3), dtype=np.uint8)
+
+    for i, frame in enumerate(frames):
+        if ignition <= i and (burnout is None or i < burnout):
+            frontRight = right + speed * (i - ignition)
+            frontLeft = 20 if width is None else frontRight - width
+            frame[40:100, frontLeft:frontRight] = FLAME_COLOUR
+
+        for _ in range(embers if i > 0 else 0):
+            top, left = rng.integers(0, shape[0] - 5), rng.integers(0, shape[1] - 5)
+            emberHeight, emberWidth = rng.integers(1, 30, size=2)
+            frame[top : top + emberHeight, left : left + emberWidth] = FLAME_COLOUR
+
+    return frames
+
+
+def writeFrames(directory, frames):
+    """
+    Save frames as an image sequence in the new directory
+    """
+    directory.mkdir()
+    for i, frame in enumerate(frames):
+        imsave(str(directory / f"frame{i:04d}.png"), frame, check_contrast=False)
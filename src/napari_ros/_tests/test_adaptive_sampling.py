@@ -0,0 +1,66 @@
+import json
+import numpy as np
+import pandas as pd
+
+from napari_ros.analyze.HSVMask.HSVMaskAnalyzer import HSVMaskAnalyzer, concatenateResults
+from napari_ros.analyze.HSVMask.adaptiveSampling import findAnalysisWindow, iterWindowResults
+from napari_ros.analyze.HSVMask.batchAnalysis import analyzeInput, getDefaultConfig
+
+from .flameData import CONFIG as FLAME_CONFIG
+from .flameData import flameFrames, writeFrames
+
+CONFIG = {**getDefaultConfig(), **FLAME_CONFIG, "chunkSize": 8}
+
+# Flame ignites at frame 30, moves right 2 px per frame and is gone from frame 90
+BURN = {"ignition": 30, "burnout": 90, "right": 22, "speed": 2}
+
+
+def test_window_results_match_dense_analysis():
+    analyzer = HSVMaskAnalyzer()
+    frames = flameFrames(120, **BURN)
+
+    dense = analyzer.analyzeFrames(frames, CONFIG)
+    start, stop = findAnalysisWindow(analyzer, frames, CONFIG, 16)
+
+    # Ignition is exact, the window ends after the highest frame
+    assert start == 30
+    assert stop > dense["highestXPos"].argmax()
+
+    # The front moves every frame, so no block is flat and blocks of 2 stay exact too
+    for flatStep in [1, 2]:
+        windowed = concatenateResults(iterWindowResults(analyzer, frames, start, stop, CONFIG, flatStep))
+        for key, values in windowed.items():
+            np.testing.assert_array_equal(values, dense[key][start:stop])
+
+
+def test_no_flame_gives_an_empty_window():
+    frames = flameFrames(40, **{**BURN, "ignition": 40})
+
+    assert findAnalysisWindow(HSVMaskAnalyzer(), frames, CONFIG, 8) == (0, 0)
+    assert findAnalysisWindow(HSVMaskAnalyzer(), frames[:0], CONFIG, 8) == (0, 0)
+
+
+def test_adaptive_analysis_exports_the_dense_results(tmp_path):
+    frames = flameFrames(120, **BURN)
+
+    exported = {}
+    for name, adaptiveSampling in [("dense", False), ("adaptive", True)]:
+        directory = tmp_path / name
+        writeFrames(directory, frames)
+
+        config = {**CONFIG, "adaptiveSampling": adaptiveSampling, "samplingProbes": 16}
+        for _ in analyzeInput(str(directory), config, name):
+            pass
+
+        exportDir = tmp_path / "data" / name
+        exported[name] = pd.read_csv(exportDir / "highestXPos.csv")
+        with open(exportDir / "metadata.json") as f:
+            exported[name + "Metadata"] = json.load(f)
+
+    pd.testing.assert_frame_equal(exported["adaptive"], exported["dense"])
+
+    sampling = exported["adaptiveMetadata"]["sampling"]
+    assert sampling["totalFrames"] == 120
+    assert sampling["window"][0] == 30
+    assert sampling["framesAnalyzed"] < 120
+    assert "sampling" not in exported["denseMetadata"]
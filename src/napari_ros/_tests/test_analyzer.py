@@ -0,0 +1,233 @@
+import numpy as np
+import pytest
+from skimage.color import rgb2hsv
+
+from napari_ros.analyze.HSVMask import HSVMaskAnalyzer as analyzerModule
+from napari_ros.analyze.HSVMask.HSVMaskAnalyzer import HSVMaskAnalyzer
+from napari_ros.analyze.HSVMask.flameMask import getFlameMask, filterFlameComponents
+from napari_ros.analyze.HSVMask.previewCache import PreviewCache
+
+H = (0.0, 0.32407407407407407)
+S = (0.0, 0.6620370370370371)
+V = (0.9, 1.0)
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    analyzer = HSVMaskAnalyzer()
+    analyzer.getHsvFrame(np.zeros((1, 1, 3), dtype=np.uint8))
+    return analyzer
+
+
+def randomFrame(shape=(120, 160)):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (*shape, 3), dtype=np.uint8)
+
+
+def flameFrame(shape=(120, 160), front=100):
+    """Dark frame with a bright yellow flame left of column front."""
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 60, (*shape, 3), dtype=np.uint8)
+    rows, cols = np.mgrid[: shape[0], : shape[1]]
+    flame = (cols < front) & (cols > front // 3) & (rows > shape[0] // 4)
+    flame &= rows > shape[0] // 2 - (cols - front // 3) // 2
+    frame[flame] = (255, 230, 120)
+    return frame
+
+
+def referenceAnalyzeFrame(frame, crop, secondCropBox, mirror, h, s, v):
+    """Frame analysis as originally written with rgb2hsv and np.where."""
+    if mirror:
+        frame = np.flip(frame, axis=1)
+
+    secondFrame = frame[
+        secondCropBox[0] : secondCropBox[1], secondCropBox[2] : secondCropBox[3]
+    ]
+    secondMask = getFlameMask(h, s, v, rgb2hsv(secondFrame))
+    frame = frame[crop[0] : crop[1], crop[2] : crop[3]]
+    mask = getFlameMask(h, s, v, rgb2hsv(frame))
+
+    rows, cols = np.where(secondMask)
+    if len(cols) == 0:
+        bbox = [0, 0, 0, 0]
+        flameTip = [0, 0]
+    else:
+        bbox = [rows.min(), rows.max(), cols.min(), cols.max()]
+        flameTip = [cols[rows == bbox[0]].max(), bbox[0]]
+
+    cols = np.where(mask)[1]
+    highestXPos = cols.max() if len(cols) else 0
+    lowestXPos = cols.min() if len(cols) else 0
+
+    return frame, mask, highestXPos, bbox, secondMask, lowestXPos, flameTip
+
+
+def assertSameResults(result, expected):
+    assert len(result) == len(expected)
+    for value, expectedValue in zip(result, expected):
+        np.testing.assert_array_equal(value, expectedValue)
+
+
+CROPS = [
+    # crop inside the second crop box, like the default config
+    ([60, 110, 10, 150], [20, 110, 10, 150]),
+    # disjoint boxes
+    ([0, 30, 0, 40], [80, 120, 100, 160]),
+    # out of bounds and empty boxes
+    ([100, 500, 150, 2000], [50, 40, 10, 150]),
+]
+
+
+def test_hsv_lookup_matches_rgb2hsv(analyzer):
+    frame = randomFrame()
+    np.testing.assert_array_equal(analyzer.getHsvFrame(frame), rgb2hsv(frame))
+
+
+def test_mask_matches_rgb2hsv(analyzer):
+    frame = randomFrame()
+    expected = getFlameMask(H, S, V, rgb2hsv(frame))
+    np.testing.assert_array_equal(analyzer.getMask(H, S, V, frame), expected)
+
+
+def test_flame_table_is_cached_per_hsv_range(analyzer):
+    table = analyzer.getFlameTable(H, S, V)
+    assert table.nbytes == 2 * 1024 * 1024
+    assert analyzer.getFlameTable(list(H), list(S), list(V)) is table
+    assert analyzer.getFlameTable(H, S, (0.5, 1.0)) is not table
+
+
+@pytest.mark.parametrize("mirror", [False, True])
+@pytest.mark.parametrize("crop, secondCropBox", CROPS)
+def test_completely_analyze_frame_matches_reference(
+    analyzer, crop, secondCropBox, mirror
+):
+    for frame in (flameFrame(), randomFrame()):
+        assertSameResults(
+            analyzer.completelyAnalyzeFrame(
+                frame, crop, secondCropBox, mirror, H, S, V
+            ),
+            referenceAnalyzeFrame(frame, crop, secondCropBox, mirror, H, S, V),
+        )
+
+
+def test_extents_wrappers(analyzer):
+    mask = np.zeros((10, 12), dtype=bool)
+    assert analyzer.getBoundingBoxFromBinaryMask(mask) == [0, 0, 0, 0]
+    assert analyzer.getFlameTipFromBinaryMaskAndBoundaryBox(mask, 0) == [0, 0]
+
+    mask[3, 2:5] = True
+    mask[6, 1:9] = True
+    assert analyzer.getBoundingBoxFromBinaryMask(mask) == [3, 6, 1, 8]
+    assert analyzer.getHighestXPosFromBinaryMask(mask) == 8
+    assert analyzer.getLowestXPosFromBinaryMask(mask) == 1
+    assert analyzer.getFlameTipFromBinaryMaskAndBoundaryBox(mask, 3) == [4, 3]
+    assert analyzer.getFlameTipFromBinaryMaskAndBoundaryBox(mask, 4) == [0, 0]
+
+
+@pytest.mark.parametrize("mirror", [False, True])
+@pytest.mark.parametrize("framesPerBlock", [1, 2, 5])
+def test_analyze_frames_matches_reference_per_frame(
+    analyzer, monkeypatch, mirror, framesPerBlock
+):
+    crop, secondCropBox = CROPS[0]
+    stack = np.stack(
+        [flameFrame(front=front) for front in (0, 40, 80, 120, 160)]
+    )
+    monkeypatch.setattr(
+        analyzerModule,
+        "MAX_BLOCK_PIXELS",
+        framesPerBlock * stack.shape[1] * stack.shape[2],
+    )
+    config = {
+        "crop": crop,
+        "secondCropBox": secondCropBox,
+        "mirror": mirror,
+        "h": H,
+        "s": S,
+        "v": V,
+    }
+
+    results = analyzer.analyzeFrames(stack, config)
+
+    for i, frame in enumerate(stack):
+        expected = referenceAnalyzeFrame(
+            frame, crop, secondCropBox, mirror, H, S, V
+        )
+        assert results["highestXPos"][i] == expected[2]
+        assert list(results["boundingBoxWithSecondCropBox"][i]) == expected[3]
+        assert results["lowestXPos"][i] == expected[5]
+        assert list(results["flameTipCoordinates"][i]) == expected[6]
+
+
+@pytest.mark.parametrize("mirror", [False, True])
+@pytest.mark.parametrize("crop, secondCropBox", CROPS)
+def test_preview_cache_matches_reference(analyzer, crop, secondCropBox, mirror):
+    frames = np.stack([flameFrame(front=80), flameFrame(front=120)])
+    previewCache = PreviewCache(analyzer)
+
+    for frameNumber, frame in enumerate(frames):
+        fullMask = previewCache.getMask(frames, frameNumber, H, S, V)
+        results = analyzer.analyzeFullFrameMask(
+            fullMask, crop, secondCropBox, mirror
+        )
+        expected = referenceAnalyzeFrame(
+            frame, crop, secondCropBox, mirror, H, S, V
+        )
+        assertSameResults(results, expected[1:])
+
+    # Changing only v reuses the decoded frame and its RGB index
+    previewCache.getMask(frames, 1, H, S, (0.5, 1.0))
+    assert len(previewCache.frames) == 2
+    assert len(previewCache.rgbIndices) == 2
+    assert len(previewCache.masks) == 3
+
+
+def test_filter_flame_components():
+    masks = np.zeros((2, 20, 30), dtype=bool)
+    masks[0, 2:10, 2:12] = True  # 80 px
+    masks[0, 15:17, 20:22] = True  # 4 px
+    masks[0, 11, 13] = masks[0, 10, 12] = True  # touches the big one diagonally
+    masks[1, 5:8, 25:28] = True  # 9 px
+
+    filtered = filterFlameComponents(masks, minComponentArea=5)
+    assert filtered[0].sum() == 80 + 2
+    assert not filtered[0, 15:17, 20:22].any()
+    assert filtered[1].sum() == 9
+
+    largest = filterFlameComponents(masks, keepLargestComponent=True)
+    assert largest[0].sum() == 82 and largest[1].sum() == 9
+
+    # The input is left as it is
+    assert masks[0].sum() == 86
+
+
+@pytest.mark.parametrize("mirror", [False, True])
+def test_component_filter_ignores_embers(analyzer, mirror):
+    frame = flameFrame(front=80)
+    embers = frame.copy()
+    embers[100:102, 140:142] = (255, 230, 120)
+    config = {
+        "crop": [60, 110, 10, 150],
+        "secondCropBox": [20, 110, 10, 150],
+        "mirror": mirror,
+        "h": H,
+        "s": S,
+        "v": V,
+    }
+
+    expected = analyzer.analyzeFrames(frame[np.newaxis], config)
+    unfiltered = analyzer.analyzeFrames(embers[np.newaxis], config)
+    assert any(not np.array_equal(unfiltered[key], expected[key]) for key in expected)
+
+    for componentFilter in [{"minComponentArea": 10}, {"keepLargestComponent": True}]:
+        results = analyzer.analyzeFrames(embers[np.newaxis], {**config, **componentFilter})
+        for key in results:
+            np.testing.assert_array_equal(results[key], expected[key])
+
+        # The preview filters the same way
+        fullMask = analyzer.getMask(H, S, V, embers)
+        preview = analyzer.analyzeFullFrameMask(
+            fullMask, config["crop"], config["secondCropBox"], mirror, **componentFilter
+        )
+        assert preview[1] == expected["highestXPos"][0]
+        assert list(preview[2]) == list(expected["boundingBoxWithSecondCropBox"][0])
@@ -0,0 +1,78 @@
+import os
+import numpy as np
+
+from napari_ros.analyze.HSVMask.checkpoint import AnalysisCheckpoint, RECORD_DTYPE
+
+CONFIG = {
+    "crop": [0, 10, 0, 20],
+    "secondCropBox": [0, 10, 0, 20],
+    "mirror": True,
+    "h": [0.0, 0.3],
+    "s": [0.0, 0.6],
+    "v": [0.9, 1.0],
+    "fps": 30,
+}
+
+
+def makeResults(start, count):
+    frames = np.arange(start, start + count)
+    return {
+        "highestXPos": frames,
+        "lowestXPos": -frames,
+        "boundingBoxWithSecondCropBox": np.stack([frames] * 4, axis=1),
+        "flameTipCoordinates": np.stack([frames, frames + 1], axis=1),
+    }
+
+
+def openCheckpoint(tmp_path, config=CONFIG):
+    checkpoint = AnalysisCheckpoint(str(tmp_path / "checkpoint"), str(tmp_path / "input"), config)
+    return checkpoint, checkpoint.openForAppend()
+
+
+def test_checkpoint_resumes(tmp_path):
+    (tmp_path / "input").mkdir()
+    (tmp_path / "input" / "0.png").write_bytes(b"frame")
+
+    checkpoint, startFrame = openCheckpoint(tmp_path)
+    assert startFrame == 0
+    checkpoint.append(makeResults(0, 5))
+    checkpoint.close()
+
+    # Simulate a crash in the middle of writing a record
+    with open(checkpoint.recordsPath, "ab") as f:
+        f.write(b"\0" * (RECORD_DTYPE.itemsize // 2))
+
+    # Settings that don't change the analysis don't restart it
+    checkpoint, startFrame = openCheckpoint(tmp_path, {**CONFIG, "fps": 60})
+    assert startFrame == 5
+    checkpoint.append(makeResults(5, 3))
+
+    results = checkpoint.load()
+    checkpoint.close()
+
+    expected = makeResults(0, 8)
+    assert len(results) == 8
+    np.testing.assert_array_equal(results["highestXPos"], expected["highestXPos"])
+    np.testing.assert_array_equal(results["lowestXPos"], expected["lowestXPos"])
+    np.testing.assert_array_equal(results["bbox_bottomright_x"], expected["boundingBoxWithSecondCropBox"][:, 3])
+    np.testing.assert_array_equal(results["flameTip_y"], expected["flameTipCoordinates"][:, 1])
+
+
+def test_checkpoint_restarts_when_config_or_input_change(tmp_path):
+    (tmp_path / "input").mkdir()
+    (tmp_path / "input" / "0.png").write_bytes(b"frame")
+
+    checkpoint, _ = openCheckpoint(tmp_path)
+    checkpoint.append(makeResults(0, 5))
+    checkpoint.close()
+
+    checkpoint, startFrame = openCheckpoint(tmp_path, {**CONFIG, "mirror": False})
+    assert startFrame == 0
+    checkpoint.append(makeResults(0, 5))
+    checkpoint.close()
+
+    (tmp_path / "input" / "1.png").write_bytes(b"another frame")
+    checkpoint, startFrame = openCheckpoint(tmp_path, {**CONFIG, "mirror": False})
+    assert startFrame == 0
+    assert os.path.getsize(checkpoint.recordsPath) == 0
+    checkpoint.close()
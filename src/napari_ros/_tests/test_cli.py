@@ -0,0 +1,64 @@
+import json
+import os
+
+from napari_ros.cli import expandInputs, main
+from napari_ros.analyze.HSVMask.rgbToHsvLookup import load_rgb_to_hsv_lookup
+
+from .test_video import writeVideo
+
+
+def writeConfig(path):
+    config = {
+        "crop": [0, 64, 0, 96],
+        "secondCropBox": [0, 64, 0, 96],
+        "mirror": True,
+        "v": [0.1, 1.0],
+        "pixelsInUnit": 10,
+        "cmApart": 1,
+        "fps": 30,
+        "chunkSize": 8,
+    }
+    with open(path, "w") as f:
+        json.dump(config, f)
+
+
+def test_expand_inputs(tmp_path):
+    for name in ["b.mp4", "a.mp4", "c.txt"]:
+        (tmp_path / name).write_bytes(b"")
+
+    inputPaths = expandInputs([str(tmp_path / "*.mp4"), str(tmp_path / "a.mp4")])
+    assert inputPaths == [str(tmp_path / "a.mp4"), str(tmp_path / "b.mp4")]
+
+
+def test_cli_analyzes_videos_in_processes(tmp_path):
+    # Build the session's lookup table before the processes share it
+    load_rgb_to_hsv_lookup()
+
+    for name in ["burn1", "burn2"]:
+        writeVideo(str(tmp_path / f"{name}.mp4"), frameCount=20)
+    writeConfig(tmp_path / "config.json")
+
+    exitCode = main(
+        [
+            "analyze",
+            str(tmp_path / "burn*.mp4"),
+            "--config",
+            str(tmp_path / "config.json"),
+            "--workers",
+            "2",
+        ]
+    )
+
+    assert exitCode == 0
+    for name in ["burn1", "burn2"]:
+        for fileName in ["highestXPos.csv", "metadata.json", "highestXPos.png"]:
+            assert os.path.exists(tmp_path / "data" / name / fileName)
+
+
+def test_cli_reports_missing_inputs(tmp_path):
+    writeConfig(tmp_path / "config.json")
+
+    exitCode = main(
+        ["analyze", str(tmp_path / "missing.mp4"), "--config", str(tmp_path / "config.json")]
+    )
+    assert exitCode == 1
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from napari_ros.analyze.HSVMask.HSVMaskAnalyzer import HSVMaskAnalyzer
+
+from .flameData import CONFIG as FLAME_CONFIG
+from .flameData import flameFrames
+
+CONFIG = {**FLAME_CONFIG, "coarseToFine": True, "coarseTileSize": 16}
+
+# A flame front and a few specks in every frame but the first
+BLOBS = {"ignition": 1, "embers": 3}
+
+
+@pytest.mark.parametrize("mirror", [False, True])
+@pytest.mark.parametrize("v", [[0.9, 1.0], [0.1, 0.2]])
+def test_coarse_to_fine_matches_full_resolution(mirror, v):
+    analyzer = HSVMaskAnalyzer()
+    config = {**CONFIG, "mirror": mirror, "v": v}
+    frames = flameFrames(12, **BLOBS)
+
+    expected = analyzer.analyzeFrames(frames, {**config, "coarseToFine": False})
+    results = analyzer.analyzeFrames(frames, config)
+
+    # The crop boxes aren't a whole number of tiles wide
+    assert expected["highestXPos"][1:].any()
+    for key, values in results.items():
+        np.testing.assert_array_equal(values, expected[key])
+
+
+def test_coarse_to_fine_only_without_masks():
+    config = {**CONFIG, "mirror": True, "v": [0.9, 1.0]}
+
+    results = HSVMaskAnalyzer().analyzeFrames(flameFrames(2, **BLOBS), config, returnMasks=True)
+    assert results["masks"].shape == (2, 50, 140)
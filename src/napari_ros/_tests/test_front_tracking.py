@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from napari_ros.analyze.HSVMask.HSVMaskAnalyzer import HSVMaskAnalyzer, concatenateResults
+from napari_ros.analyze.HSVMask.frontTracking import FrontTracker
+from napari_ros.analyze.HSVMask.parallelAnalysis import analyzeFramesInChunks
+
+from .flameData import CONFIG as FLAME_CONFIG
+from .flameData import FLAME_COLOUR, flameFrames
+
+CONFIG = {
+    **FLAME_CONFIG,
+    "crop": [60, 110, 10, 310],
+    "secondCropBox": [20, 110, 10, 310],
+    "frontTracking": True,
+    # Less than the flame moves per frame, so the band has to follow it
+    "trackingMargin": 2,
+    "trackingRefreshFrames": 20,
+}
+
+# A 30 px wide flame moving right by 4 px per frame, starting at frame 5
+SPREADING = {"shape": (120, 320), "ignition": 5, "right": 40, "speed": 4, "width": 30}
+
+
+@pytest.mark.parametrize("mirror", [False, True])
+@pytest.mark.parametrize("chunkSize", [1, 8])
+@pytest.mark.parametrize("refreshFrames", [20, 0])
+def test_tracking_matches_full_width_analysis(mirror, chunkSize, refreshFrames):
+    analyzer = HSVMaskAnalyzer()
+    config = {**CONFIG, "mirror": mirror, "trackingRefreshFrames": refreshFrames}
+    frames = flameFrames(60, **SPREADING)
+
+    expected = analyzer.analyzeFrames(frames, config)
+
+    tracker = FrontTracker(analyzer, config)
+    tracked = concatenateResults(
+        tracker.analyzeFrames(frames[start : start + chunkSize])
+        for start in range(0, len(frames), chunkSize)
+    )
+
+    for key, values in tracked.items():
+        np.testing.assert_array_equal(values, expected[key])
+
+    # Most frames only needed the band
+    assert tracker.fullWidthFrames < len(frames) // 2
+
+
+def test_tracking_falls_back_when_the_flame_jumps():
+    analyzer = HSVMaskAnalyzer()
+    config = {**CONFIG, "mirror": False}
+
+    # Flame grows far past the band from one frame to the next
+    frames = flameFrames(16, **SPREADING)
+    frames[12][40:100, 60:300] = FLAME_COLOUR
+
+    expected = analyzer.analyzeFrames(frames, config)
+    tracked = concatenateResults(analyzeFramesInChunks(analyzer, frames, config, chunkSize=4))
+
+    for key, values in tracked.items():
+        np.testing.assert_array_equal(values, expected[key])
@@ -0,0 +1,110 @@
+import json
+import os
+import numpy as np
+import pytest
+
+from napari_ros.analyze.HSVMask.HSVMaskAnalyzer import HSVMaskAnalyzer
+from napari_ros.analyze.HSVMask import batchAnalysis
+from napari_ros.analyze.HSVMask.batchAnalysis import analyzeInput, getDefaultConfig
+from napari_ros.analyze.HSVMask.maskArchive import MaskArchive, MaskArchiveWriter, packMasks
+
+from .flameData import CONFIG as FLAME_CONFIG
+from .flameData import flameFrames, writeFrames
+
+CONFIG = {**getDefaultConfig(), **FLAME_CONFIG, "chunkSize": 4, "maskArchive": True}
+
+
+def randomMasks(count, shape, seed):
+    return np.random.default_rng(seed).random((count, *shape)) > 0.5
+
+
+def test_archive_random_access(tmp_path):
+    # Mask sizes that aren't a whole number of bytes
+    masksWithSecondCropBox = randomMasks(10, (13, 7), 0)
+    masks = randomMasks(10, (5, 3), 1)
+
+    writer = MaskArchiveWriter(str(tmp_path))
+    for start in [4, 0, 8]:
+        packedMasks, maskShapes = packMasks(masksWithSecondCropBox[start : start + 4], masks[start : start + 4])
+        writer.write(start, {"packedMasks": packedMasks, "maskShapes": maskShapes})
+    writer.close(frames=12)
+
+    archive = MaskArchive(str(tmp_path))
+    assert len(archive) == 12
+    assert archive.header["recordBytes"] == 12 + 2
+
+    for frame in [9, 0, 5]:
+        np.testing.assert_array_equal(archive[frame]["maskWithSecondCropBox"], masksWithSecondCropBox[frame])
+        np.testing.assert_array_equal(archive[frame]["mask"], masks[frame])
+
+    # Frames that were never written are empty
+    assert not archive[11]["mask"].any()
+
+
+def test_resume_needs_the_saved_records(tmp_path):
+    packedMasks, maskShapes = packMasks(randomMasks(4, (13, 7), 0), randomMasks(4, (5, 3), 1))
+    writer = MaskArchiveWriter(str(tmp_path), resume=True)
+
+    assert not writer.canResume(4)
+    with pytest.raises(ValueError):
+        writer.write(4, {"packedMasks": packedMasks, "maskShapes": maskShapes})
+
+
+def cancelAfterFirstChunk(directory):
+    run = analyzeInput(str(directory), CONFIG)
+    assert next(run) == "reading frames"
+    assert next(run).startswith("analyzing frame 4/10")
+    try:
+        run.send("cancel")
+    except StopIteration as stop:
+        assert stop.value.startswith("cancelled after frame 4")
+
+
+def test_batch_analysis_archives_every_mask(tmp_path, monkeypatch):
+    frames = flameFrames()
+    directory = tmp_path / "burn"
+    writeFrames(directory, frames)
+
+    # Stop after the first chunk and resume, the archive carries on where it was
+    monkeypatch.setattr(batchAnalysis, "STATUS_INTERVAL", 0)
+    cancelAfterFirstChunk(directory)
+    assert len(MaskArchive(str(tmp_path / "data" / "burn"))) == 4
+    for _ in analyzeInput(str(directory), CONFIG):
+        pass
+
+    expected = HSVMaskAnalyzer().analyzeFrames(frames, CONFIG, returnMasks=True)
+    archive = MaskArchive(str(tmp_path / "data" / "burn"))
+
+    assert len(archive) == len(frames)
+    for frame in range(len(frames)):
+        np.testing.assert_array_equal(archive[frame]["mask"], expected["masks"][frame])
+        np.testing.assert_array_equal(
+            archive[frame]["maskWithSecondCropBox"], expected["masksWithSecondCropBox"][frame]
+        )
+
+    with open(tmp_path / "data" / "burn" / "metadata.json") as f:
+        assert json.load(f)["maskArchive"]["frames"] == len(frames)
+
+    # About a bit per pixel
+    assert os.path.getsize(tmp_path / "data" / "burn" / "masks.bin") == len(frames) * (90 * 140 + 50 * 140) // 8
+
+
+def test_resume_without_the_archive_starts_over(tmp_path, monkeypatch):
+    frames = flameFrames()
+    directory = tmp_path / "burn"
+    writeFrames(directory, frames)
+
+    monkeypatch.setattr(batchAnalysis, "STATUS_INTERVAL", 0)
+    cancelAfterFirstChunk(directory)
+    os.remove(tmp_path / "data" / "burn" / "masks.json")
+
+    # The checkpoint has 4 frames, but their masks are gone
+    run = analyzeInput(str(directory), CONFIG)
+    assert next(run) == "reading frames"
+    for _ in run:
+        pass
+
+    expected = HSVMaskAnalyzer().analyzeFrames(frames, CONFIG, returnMasks=True)
+    archive = MaskArchive(str(tmp_path / "data" / "burn"))
+    for frame in range(len(frames)):
+        np.testing.assert_array_equal(archive[frame]["mask"], expected["masks"][frame])
@@ -0,0 +1,56 @@
+import numpy as np
+
+from napari_ros.analyze.HSVMask.HSVMaskAnalyzer import HSVMaskAnalyzer, concatenateResults
+from napari_ros.analyze.HSVMask.parallelAnalysis import (
+    analyzeFramesInChunks,
+    analyzeFramesInParallel,
+)
+from napari_ros.analyze.HSVMask.stageTimer import StageTimer
+
+from .flameData import CONFIG, flameFrames
+
+
+def test_parallel_results_are_in_frame_order():
+    analyzer = HSVMaskAnalyzer()
+
+    expected = [
+        analyzer.completelyAnalyzeFrame(
+            frame,
+            CONFIG["crop"],
+            CONFIG["secondCropBox"],
+            CONFIG["mirror"],
+            CONFIG["h"],
+            CONFIG["s"],
+            CONFIG["v"],
+        )
+        for frame in flameFrames()
+    ]
+
+    serialTimer = StageTimer()
+    serial = concatenateResults(
+        analyzeFramesInChunks(analyzer, flameFrames(), CONFIG, chunkSize=4, timer=serialTimer)
+    )
+    parallelTimer = StageTimer()
+    parallel = concatenateResults(
+        analyzeFramesInParallel(flameFrames(), CONFIG, workers=2, chunkSize=3, timer=parallelTimer)
+    )
+
+    # Every frame is read once, every chunk goes through each stage
+    assert serialTimer.calls["decode"] == parallelTimer.calls["decode"] == 10
+    assert serialTimer.calls["extents"] == 3
+    assert parallelTimer.calls["extents"] == 4
+    assert "timings" not in parallel
+
+    for results in (serial, parallel):
+        np.testing.assert_array_equal(
+            results["highestXPos"], [e[2] for e in expected]
+        )
+        np.testing.assert_array_equal(
+            results["boundingBoxWithSecondCropBox"], [e[3] for e in expected]
+        )
+        np.testing.assert_array_equal(
+            results["lowestXPos"], [e[5] for e in expected]
+        )
+        np.testing.assert_array_equal(
+            results["flameTipCoordinates"], [e[6] for e in expected]
+        )
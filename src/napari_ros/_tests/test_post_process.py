@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+
+from napari_ros.analyze.HSVMask.batchAnalysis import analyzeInput, getDefaultConfig
+from napari_ros.analyze.HSVMask.postProcess import postProcess
+from napari_ros.analyze.HSVMask.resultStore import ResultStore
+from napari_ros.analyze.HSVMask.stageTimer import StageTimer
+
+CONFIG = {"pixelsInUnit": 104, "cmApart": 4.5, "fps": 59.94}
+
+
+def makeResults(frameCount=300):
+    # Flame ignites at frame 20 and moves right at a constant speed
+    highestXPos = np.clip(np.arange(frameCount) - 20, 0, None) * 3
+    zeros = np.zeros(frameCount, dtype=np.int64)
+
+    results = ResultStore()
+    results.append(
+        {
+            "highestXPos": highestXPos,
+            "lowestXPos": zeros,
+            "boundingBoxWithSecondCropBox": np.stack([zeros] * 4, axis=1),
+            "flameTipCoordinates": np.stack([highestXPos, zeros], axis=1),
+        }
+    )
+    return results
+
+
+def test_post_process_from_a_thread(tmp_path):
+    exportDir = str(tmp_path)
+
+    # Plots are drawn in the calling thread, like in the analysis worker
+    thread = threading.Thread(
+        target=postProcess, args=(makeResults(), CONFIG, "burn", exportDir)
+    )
+    thread.start()
+    thread.join()
+
+    for fileName in ["highestXPos.csv", "metadata.json", "highestXPos.png"]:
+        assert os.path.getsize(os.path.join(exportDir, fileName)) > 0
+
+
+@pytest.mark.parametrize("exportFormat", ["parquet", "feather"])
+def test_post_process_columnar_export(tmp_path, exportFormat):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    exportDir = str(tmp_path)
+    postProcess(makeResults(), {**CONFIG, "exportFormats": [exportFormat]}, "burn", exportDir)
+
+    path = os.path.join(exportDir, f"highestXPos.{exportFormat}")
+    if exportFormat == "parquet":
+        table = pyarrow.parquet.read_table(path)
+    else:
+        table = pyarrow.feather.read_table(path)
+
+    # Same data as the CSV, with the metadata in the schema
+    csv = pd.read_csv(os.path.join(exportDir, "highestXPos.csv"), index_col=0)
+    pd.testing.assert_frame_equal(table.to_pandas(), csv, check_dtype=False)
+    assert table.schema.field("highestXPos").type == pa.int64()
+
+    metadata = json.loads(table.schema.metadata[b"napari_ros"])
+    with open(os.path.join(exportDir, "metadata.json")) as f:
+        assert metadata == json.load(f)
+
+
+def test_post_process_unknown_export_format(tmp_path):
+    with pytest.raises(ValueError):
+        postProcess(makeResults(), {**CONFIG, "exportFormats": ["xlsx"]}, "burn", str(tmp_path))
+
+
+def test_unknown_export_format_fails_before_analysis(tmp_path):
+    # The input doesn't exist, so this has to fail before reading any frame
+    run = analyzeInput(str(tmp_path / "burn"), {**getDefaultConfig(), "exportFormats": ["xlsx"]})
+    with pytest.raises(ValueError):
+        next(run)
+    assert not (tmp_path / "data").exists()
+
+
+def test_stage_timings_in_metadata(tmp_path):
+    timer = StageTimer()
+    timer.add("decode", 0.5, 10)
+    with timer.measure("threshold"):
+        pass
+
+    postProcess(makeResults(), CONFIG, "burn", str(tmp_path), timer)
+
+    with open(tmp_path / "metadata.json") as f:
+        timings = json.load(f)["timings"]
+
+    assert timings["decode"] == {"seconds": 0.5, "calls": 10, "msPerCall": 50.0}
+    for stage in ["threshold", "postProcess", "csv", "plot"]:
+        assert timings[stage]["calls"] == 1
@@ -0,0 +1,48 @@
+import numpy as np
+from napari.components import ViewerModel
+
+from napari_ros.analyze.HSVMask.previewOverlays import PreviewOverlays
+
+
+def makePreview(highestXPos=30):
+    mask = np.zeros((40, 80), dtype=bool)
+    mask[10:20, :highestXPos] = True
+
+    return {
+        "frameShape": (100, 120),
+        "crop": [50, 90, 10, 110],
+        "secondCropBox": [50, 90, 10, 90],
+        "maskWithSecondCropBox": mask,
+        "highestXPos": highestXPos,
+        "lowestXPos": 0,
+        "boundingBoxWithSecondCropBox": [10, 20, 0, highestXPos],
+        "flameTipCoordinates": [highestXPos, 10],
+    }
+
+
+def test_overlays_are_updated_in_place():
+    # The viewer model is enough, no canvas needed
+    viewer = ViewerModel()
+    overlays = PreviewOverlays(viewer)
+
+    overlays.update(makePreview())
+    layers = dict(overlays.layers)
+    assert len(viewer.layers) == 7
+
+    # The mask layer only holds the second crop box
+    maskLayer = layers["Mask WITH SECOND CROP BOX"]
+    assert maskLayer.data.shape == (40, 80)
+    assert tuple(maskLayer.translate) == (50, 10)
+
+    crop = layers["Crop"].data[0].copy()
+    overlays.update(makePreview(highestXPos=50))
+
+    # Same layer objects, with the new positions
+    assert len(viewer.layers) == 7
+    assert all(overlays.layers[name] is layer for name, layer in layers.items())
+    np.testing.assert_array_equal(layers["Crop"].data[0], crop)
+    np.testing.assert_array_equal(
+        layers["Highest X Pos"].data[0], [[50, 60], [100, 60]]
+    )
+    np.testing.assert_array_equal(layers["Flame Tip"].data, [[60, 60]])
+    assert maskLayer.data[15, 45] == 1
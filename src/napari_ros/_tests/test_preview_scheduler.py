@@ -0,0 +1,30 @@
+import threading
+
+from napari_ros.analyze.HSVMask.previewScheduler import PreviewScheduler
+
+
+def test_only_the_newest_request_runs():
+    scheduler = PreviewScheduler()
+
+    for frame in range(5):
+        scheduler.submit({"currentFrameNumber": frame})
+
+    request = scheduler.waitForRequest()
+    assert request["currentFrameNumber"] == 4
+    assert not scheduler.isStale(request)
+
+    scheduler.submit({"currentFrameNumber": 5})
+    assert scheduler.isStale(request)
+    assert scheduler.getLatencyMs(request) >= 0
+
+
+def test_close_wakes_up_a_waiting_worker():
+    scheduler = PreviewScheduler()
+    results = []
+
+    worker = threading.Thread(target=lambda: results.append(scheduler.waitForRequest()))
+    worker.start()
+    scheduler.close()
+    worker.join(timeout=5)
+
+    assert results == [None]
@@ -29,3 +29,11 @@ def test_reader(tmp_path):
 def test_get_reader_pass():
     reader = napari_get_reader("fake.file")
     assert reader is None
+
+
+def test_get_reader_options_from_environment(monkeypatch):
+    monkeypatch.setenv("NAPARI_ROS_MULTISCALE", "1")
+    monkeypatch.setenv("NAPARI_ROS_CACHE_BYTES", "1048576")
+
+    reader = napari_get_reader("burn.mp4")
+    assert reader.keywords == {"multiscale": True, "cacheBytes": 1048576}
@@ -0,0 +1,39 @@
+import numpy as np
+
+from napari_ros.analyze.HSVMask.resultStore import ResultStore, RESULT_COLUMNS
+
+
+def makeResults(start, count):
+    frames = np.arange(start, start + count)
+    return {
+        "highestXPos": frames,
+        "lowestXPos": -frames,
+        "boundingBoxWithSecondCropBox": np.stack([frames, frames + 1, frames + 2, frames + 3], axis=1),
+        "flameTipCoordinates": np.stack([frames, frames * 2], axis=1),
+    }
+
+
+def test_result_store_grows_in_blocks():
+    results = ResultStore(capacity=4)
+
+    for start in range(0, 5000, 16):
+        results.append(makeResults(start, 16))
+
+    assert len(results) == 5008
+    assert results.capacity % 4096 == 0
+    np.testing.assert_array_equal(results["highestXPos"], np.arange(5008))
+    np.testing.assert_array_equal(results["bbox_topleft_x"], np.arange(5008) + 2)
+    np.testing.assert_array_equal(results["flameTip_y"], np.arange(5008) * 2)
+
+
+def test_result_store_data_frame_shares_memory():
+    results = ResultStore()
+    results.append(makeResults(0, 100))
+
+    df = results.toDataFrame(10, 20)
+
+    assert list(df.columns) == ["frame", *RESULT_COLUMNS]
+    np.testing.assert_array_equal(df["frame"], np.arange(1, 11))
+    np.testing.assert_array_equal(df["lowestXPos"], -np.arange(10, 20))
+    for name in RESULT_COLUMNS:
+        assert np.shares_memory(df[name].to_numpy(), results[name])
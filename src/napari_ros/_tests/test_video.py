@@ -0,0 +1,138 @@
+import av
+import numpy as np
+import pytest
+
+from napari_ros._reader import reader_function
+from napari_ros._video import (
+    VideoReader,
+    downsampleFrame,
+    iterVideoFrames,
+    iterVideoFramesFrom,
+)
+
+
+def writeVideo(path, frameCount=24, shape=(64, 96), fps=30):
+    """Write a small test video where frame i is filled with gray level 8 * i."""
+    with av.open(str(path), "w") as container:
+        stream = container.add_stream("mpeg4", rate=fps)
+        stream.height, stream.width = shape
+        stream.pix_fmt = "yuv420p"
+        stream.options = {"g": "8", "qscale": "1"}
+
+        for i in range(frameCount):
+            image = np.full((*shape, 3), 8 * i, dtype=np.uint8)
+            frame = av.VideoFrame.from_ndarray(image, format="rgb24")
+            for packet in stream.encode(frame):
+                container.mux(packet)
+
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "burn.mp4"
+    writeVideo(path)
+    return str(path)
+
+
+def test_iter_video_frames(video):
+    frames = list(iterVideoFrames(video))
+
+    assert len(frames) == 24
+    assert frames[0].shape == (64, 96, 3) and frames[0].dtype == np.uint8
+    # Frames come out in order, each one brighter than the last
+    assert np.all(np.diff([frame.mean() for frame in frames]) > 0)
+
+
+def test_video_reader_random_access_matches_stream(video):
+    expected = list(iterVideoFrames(video))
+    reader = VideoReader(video, prefetchFrames=0)
+
+    assert len(reader) == len(expected)
+    for index in [5, 23, 0, 17, 16, 3, -1]:
+        np.testing.assert_array_equal(reader[index], expected[index])
+
+    with pytest.raises(IndexError):
+        reader[len(expected)]
+
+
+def test_video_reader_never_returns_another_frame(video):
+    reader = VideoReader(video, prefetchFrames=0)
+
+    # As if frame 5 was dropped from the stream
+    del reader._ptsToIndex[int(reader.framePts[5])]
+
+    with pytest.raises(IndexError):
+        reader[5]
+    assert reader[6].mean() > reader[4].mean()
+
+
+def test_iter_video_frames_from(video):
+    frames = list(iterVideoFrames(video))
+    resumed = list(iterVideoFramesFrom(video, 10))
+
+    assert len(resumed) == len(frames) - 10
+    for frame, expected in zip(resumed, frames[10:]):
+        np.testing.assert_array_equal(frame, expected)
+
+
+def test_video_reader_cache_budget(video):
+    frameBytes = 64 * 96 * 3
+    reader = VideoReader(video, cacheBytes=4 * frameBytes, prefetchFrames=0)
+
+    for index in range(10):
+        reader[index]
+
+    assert reader._cache.nbytes <= 4 * frameBytes
+    assert list(reader._cache.keys()) == [6, 7, 8, 9]
+
+
+def test_reader_function_frame_count(video):
+    layerData, addKwargs, layerType = reader_function(video)[0]
+
+    assert layerData.shape == (24, 64, 96, 3)
+    np.testing.assert_array_equal(
+        layerData[10].compute(), list(iterVideoFrames(video))[10]
+    )
+
+
+def test_reader_function_chunks_decode_in_other_processes(video):
+    layerData = reader_function(video, chunkSize=5)[0][0]
+
+    assert layerData.chunks[0] == (5, 5, 5, 5, 4)
+    assert len(layerData.__dask_graph__()) < 12
+
+    # The reader is pickled into the worker processes and reopens the file
+    frames = layerData[3:12].compute(scheduler="processes")
+    np.testing.assert_array_equal(frames, list(iterVideoFrames(video))[3:12])
+
+
+def test_reader_function_multiscale(tmp_path):
+    path = tmp_path / "wide.mp4"
+    writeVideo(path, frameCount=6, shape=(576, 1024))
+
+    layerData, addKwargs, _ = reader_function(str(path), multiscale=True)[0]
+
+    # Halving stops before the longer side goes under 512 pixels
+    assert addKwargs["multiscale"]
+    assert [level.shape for level in layerData] == [
+        (6, 576, 1024, 3),
+        (6, 288, 512, 3),
+    ]
+    fullFrame = layerData[0][2].compute()
+    np.testing.assert_array_equal(
+        layerData[1][2].compute(), downsampleFrame(fullFrame)
+    )
+
+
+@pytest.mark.parametrize("shape", [(64, 96), (65, 97)])
+def test_downsample_frame_averages_2x2_blocks(shape):
+    frame = np.random.default_rng(0).integers(0, 256, (*shape, 3), dtype=np.uint8)
+
+    blocks = frame[: shape[0] // 2 * 2, : shape[1] // 2 * 2].reshape(
+        shape[0] // 2, 2, shape[1] // 2, 2, 3
+    )
+    expected = (blocks.sum(axis=(1, 3)) + 2) // 4
+
+    np.testing.assert_array_equal(downsampleFrame(frame), expected)
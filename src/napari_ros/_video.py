@@ -0,0 +1,455 @@
+"""
+Video decoding shared by the reader and the batch analysis.
+"""
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import av
+import numpy as np
+
+VIDEO_EXTENSIONS = (".mp4",)
+
+# Memory budget for decoded frames kept by a VideoReader
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+# Frames decoded ahead of the last requested frame
+DEFAULT_PREFETCH_FRAMES = 30
+
+# Smallest pyramid level, in pixels along the longer side
+DEFAULT_PYRAMID_MIN_SIZE = 512
+
+
+def isVideoFile(path: str):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def iterVideoFrames(path: str, threadCount: int = 0):
+    """
+    Stream-decode every frame of a video as a uint8 RGB array.
+    FFmpeg decodes on its own threads (threadCount 0 lets it pick),
+    and only a handful of frames are in memory at any time.
+    """
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        stream.thread_count = threadCount
+
+        for frame in container.decode(stream):
+            yield frame.to_ndarray(format="rgb24")
+
+
+class FrameCache:
+    """
+    LRU cache of frames keyed by frame index, bounded by a byte budget.
+    Not thread safe on its own, callers hold their own lock.
+    """
+
+    def __init__(self, maxBytes: int):
+        self.maxBytes = maxBytes
+        self._frames = OrderedDict()
+        self.nbytes = 0
+
+    def __contains__(self, index: int):
+        return index in self._frames
+
+    def __len__(self):
+        return len(self._frames)
+
+    def keys(self):
+        return self._frames.keys()
+
+    def get(self, index: int):
+        frame = self._frames.get(index)
+        if frame is not None:
+            self._frames.move_to_end(index)
+        return frame
+
+    def add(self, index: int, frame: np.ndarray):
+        if index in self._frames:
+            return
+
+        self._frames[index] = frame
+        self.nbytes += frame.nbytes
+
+        # Drop the least recently used frames, but always keep the newest
+        while self.nbytes > self.maxBytes and len(self._frames) > 1:
+            _, evicted = self._frames.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self._frames.clear()
+        self.nbytes = 0
+
+
+class FrameSequence(ABC):
+    """
+    Array-like access to a sequence of equally shaped uint8 RGB frames,
+    enough for dask's from_array and napari. Subclasses set frameShape
+    and implement __len__ and getFrame.
+    """
+
+    dtype = np.dtype(np.uint8)
+    ndim = 4
+
+    @property
+    def shape(self):
+        return (len(self), *self.frameShape)
+
+    @abstractmethod
+    def __len__(self):
+        """Number of frames"""
+
+    @abstractmethod
+    def getFrame(self, index: int):
+        """(H, W, 3) frame index, counting from 0"""
+
+    def prefetch(self, index: int):  # noqa: B027 optional hook, most sequences have nothing to prefetch
+        """
+        Called after frame index was read, to get the next frames ready
+        """
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            return self._getSlice(index)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"frame {index} out of range for {len(self)} frames")
+
+        frame = self.getFrame(index)
+        self.prefetch(index)
+        return frame
+
+    def _getSlice(self, key: tuple):
+        """
+        Frames for a (frames, rows, cols, channels) key.
+        The frames are read in order, so a chunk of video costs at most one seek.
+        """
+        frameKey, spatialKey = key[0], key[1:]
+
+        if not isinstance(frameKey, slice):
+            return self[frameKey][spatialKey]
+
+        indices = range(*frameKey.indices(len(self)))
+        frames = np.empty((len(indices), *self.frameShape), dtype=self.dtype)
+        for i, index in enumerate(indices):
+            frames[i] = self.getFrame(index)
+
+        if len(indices) > 0:
+            self.prefetch(indices[-1])
+
+        return frames[(slice(None), *spatialKey)]
+
+
+class VideoReader(FrameSequence):
+    """
+    Frame-accurate random access to a video.
+
+    An exact frame index is built once by demuxing the packets (no decoding).
+    Decoded frames are kept in an LRU cache up to cacheBytes, and after every
+    request the following prefetchFrames frames are decoded on a background
+    thread, so scrubbing and playing forward mostly hit the cache.
+    Returned frames are read-only uint8 RGB arrays.
+
+    Indexing with a slice of frames decodes them sequentially, so the reader
+    can back a chunked dask array directly. Pickling only keeps the path,
+    settings and frame index; each process reopens the file on first use.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cacheBytes: int = DEFAULT_CACHE_BYTES,
+        prefetchFrames: int = DEFAULT_PREFETCH_FRAMES,
+    ):
+        self.path = path
+        self.cacheBytes = cacheBytes
+
+        self._buildIndex()
+        self._initState()
+
+        # Prefetching more than half the cache would evict the frames it decodes
+        frameBytes = int(np.prod(self.frameShape))
+        self.prefetchFrames = min(prefetchFrames, cacheBytes // frameBytes // 2)
+
+    def _initState(self):
+        """
+        Everything that belongs to this process only
+        """
+        # Guards the container, the decoder position and the cache
+        self._lock = threading.RLock()
+        self._container = None
+        self._decoder = None
+        self._lastIndex = None
+
+        self._cache = FrameCache(self.cacheBytes)
+
+        self._prefetchCondition = threading.Condition()
+        self._prefetchCenter = None
+        self._prefetchThread = None
+        self._closed = False
+
+    def __getstate__(self):
+        return {
+            "path": self.path,
+            "cacheBytes": self.cacheBytes,
+            "prefetchFrames": self.prefetchFrames,
+            "frameShape": self.frameShape,
+            "frameRate": self.frameRate,
+            "framePts": self.framePts,
+            "_keyframeBefore": self._keyframeBefore,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._ptsToIndex = {int(p): i for i, p in enumerate(self.framePts)}
+        self._initState()
+
+    def __dask_tokenize__(self):
+        return (type(self).__name__, self.path, len(self))
+
+    def _buildIndex(self):
+        with av.open(self.path) as container:
+            stream = container.streams.video[0]
+            self.frameShape = (stream.codec_context.height, stream.codec_context.width, 3)
+            self.frameRate = float(stream.average_rate or stream.guessed_rate or 0)
+
+            pts = []
+            keyframePts = []
+            for packet in container.demux(stream):
+                # The packets flushing the demuxer have no timestamp
+                if packet.pts is None:
+                    continue
+                pts.append(packet.pts)
+                if packet.is_keyframe:
+                    keyframePts.append(packet.pts)
+
+        # Packets are in decode order, frames come out in presentation order
+        self.framePts = np.sort(np.array(pts, dtype=np.int64))
+        self._ptsToIndex = {int(p): i for i, p in enumerate(self.framePts)}
+
+        # Index of the closest keyframe at or before every frame
+        keyframeIndices = np.searchsorted(self.framePts, np.sort(keyframePts))
+        if len(keyframeIndices) == 0 or keyframeIndices[0] != 0:
+            keyframeIndices = np.concatenate([[0], keyframeIndices])
+        self._keyframeBefore = keyframeIndices[
+            np.searchsorted(keyframeIndices, np.arange(len(self.framePts)), side="right") - 1
+        ]
+
+    def __len__(self):
+        return len(self.framePts)
+
+    def getFrame(self, index: int):
+        """
+        Get a frame from the cache, or decode it
+        """
+        with self._lock:
+            frame = self._cache.get(index)
+            if frame is not None:
+                return frame
+
+            return self._decodeFrame(index)
+
+    def _openDecoder(self, keyframeIndex: int):
+        if self._container is None:
+            self._container = av.open(self.path)
+            stream = self._container.streams.video[0]
+            stream.thread_type = "AUTO"
+
+        stream = self._container.streams.video[0]
+        self._container.seek(
+            int(self.framePts[keyframeIndex]), stream=stream, backward=True
+        )
+        self._decoder = self._container.decode(stream)
+
+    def _decodeFrame(self, index: int):
+        # Keep decoding forward unless there is a keyframe to jump to
+        # between the last decoded frame and the one we want
+        if (
+            self._decoder is None
+            or self._lastIndex is None
+            or index <= self._lastIndex
+            or self._keyframeBefore[index] > self._lastIndex
+        ):
+            self._openDecoder(self._keyframeBefore[index])
+
+        frameArray = None
+        for frame in self._decoder:
+            frameIndex = self._ptsToIndex.get(frame.pts)
+            if frameIndex is None:
+                continue
+
+            self._lastIndex = frameIndex
+
+            # Frames decoded on the way are cached too
+            frameArray = frame.to_ndarray(format="rgb24")
+            frameArray.flags.writeable = False
+            self._cache.add(frameIndex, frameArray)
+
+            if frameIndex >= index:
+                break
+        else:
+            self._decoder = None
+
+        # A frame missing from the stream (a PTS gap or a dropped frame)
+        # must not be answered with the next one
+        if frameArray is None or self._lastIndex != index:
+            raise IndexError(f"could not decode frame {index} of {self.path}")
+
+        return frameArray
+
+    def prefetch(self, index: int):
+        """
+        Decode the frames after index on the background thread.
+        A newer request replaces one that hasn't finished yet.
+        """
+        if self.prefetchFrames <= 0:
+            return
+
+        with self._prefetchCondition:
+            self._prefetchCenter = index
+            self._prefetchCondition.notify()
+
+            if self._prefetchThread is None:
+                self._prefetchThread = threading.Thread(
+                    target=self._prefetchLoop, daemon=True
+                )
+                self._prefetchThread.start()
+
+    def _prefetchLoop(self):
+        while True:
+            with self._prefetchCondition:
+                while self._prefetchCenter is None and not self._closed:
+                    self._prefetchCondition.wait()
+                if self._closed:
+                    return
+                center = self._prefetchCenter
+                self._prefetchCenter = None
+
+            for index in range(center + 1, min(center + 1 + self.prefetchFrames, len(self))):
+                # Stop as soon as the slider has moved somewhere else
+                if self._prefetchCenter is not None or self._closed:
+                    break
+
+                try:
+                    with self._lock:
+                        if index not in self._cache:
+                            self._decodeFrame(index)
+                except (IndexError, av.error.FFmpegError):
+                    # Whoever asks for the frame will get the error
+                    break
+
+    def close(self):
+        with self._prefetchCondition:
+            self._closed = True
+            self._prefetchCondition.notify()
+
+        with self._lock:
+            if self._container is not None:
+                self._container.close()
+            self._container = None
+            self._decoder = None
+            self._cache.clear()
+
+
+def iterVideoFramesFrom(path: str, startFrame: int):
+    """
+    Stream-decode a video from startFrame on. The frame index is used to
+    seek to the keyframe before startFrame instead of decoding from the start.
+    """
+    # Nothing is kept around except the frame being returned
+    reader = VideoReader(path, cacheBytes=0, prefetchFrames=0)
+
+    try:
+        for index in range(startFrame, len(reader)):
+            yield reader.getFrame(index)
+    finally:
+        reader.close()
+
+
+def downsampleFrame(frame: np.ndarray):
+    """
+    Halve a frame in both directions by averaging 2x2 blocks.
+    An odd last row or column is dropped.
+    """
+    height, width = frame.shape[0] // 2, frame.shape[1] // 2
+    frame = frame[: height * 2, : width * 2]
+
+    # Adding the four strided views in place is a lot faster than
+    # summing a (height, 2, width, 2, 3) reshape over two axes
+    summed = frame[0::2, 0::2].astype(np.uint16)
+    summed += frame[1::2, 0::2]
+    summed += frame[0::2, 1::2]
+    summed += frame[1::2, 1::2]
+    summed += 2
+    summed //= 4
+    return summed.astype(np.uint8)
+
+
+class DownsampledFrames(FrameSequence):
+    """
+    One level of a multiscale pyramid: every frame of source at half the
+    resolution. Frames are derived when first read and kept in their own
+    LRU cache, so playback at this level doesn't touch full resolution
+    pixels again.
+    """
+
+    def __init__(self, source: FrameSequence, cacheBytes: int):
+        self.source = source
+        self.cacheBytes = cacheBytes
+        self.frameShape = (source.frameShape[0] // 2, source.frameShape[1] // 2, 3)
+        self._initState()
+
+    def _initState(self):
+        self._lock = threading.Lock()
+        self._cache = FrameCache(self.cacheBytes)
+
+    def __getstate__(self):
+        return {
+            "source": self.source,
+            "cacheBytes": self.cacheBytes,
+            "frameShape": self.frameShape,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._initState()
+
+    def __dask_tokenize__(self):
+        return (type(self).__name__, self.source.__dask_tokenize__())
+
+    def __len__(self):
+        return len(self.source)
+
+    def getFrame(self, index: int):
+        with self._lock:
+            frame = self._cache.get(index)
+        if frame is not None:
+            return frame
+
+        frame = downsampleFrame(self.source.getFrame(index))
+        frame.flags.writeable = False
+
+        with self._lock:
+            self._cache.add(index, frame)
+        return frame
+
+    def prefetch(self, index: int):
+        self.source.prefetch(index)
+
+
+def buildPyramid(video: VideoReader, minSize: int = DEFAULT_PYRAMID_MIN_SIZE):
+    """
+    The video followed by downsampled levels, halving each time while the
+    longer side stays at least minSize pixels. Every level caches about
+    as many frames as the full resolution cache.
+    """
+    levels = [video]
+
+    while max(levels[-1].frameShape[:2]) // 2 >= minSize:
+        levels.append(
+            DownsampledFrames(levels[-1], levels[-1].cacheBytes // 4)
+        )
+
+    return levels
@@ -1,10 +1,155 @@
+from collections import OrderedDict
 from typing import List
 import numpy as np
 from skimage.color import rgb2hsv
-from .flameMask import getFlameMask, getBinaryContours
+from .flameMask import (
+    getFlameMask,
+    getBinaryContours,
+    compileFlameTable,
+    getFlameMaskFromTable,
+    filterFlameComponents,
+)
+from .rgbToHsvLookup import (
+    load_rgb_to_hsv_lookup,
+    rgb_to_hsv,
+    rgb_to_flat_index,
+)
+from .roiPlanner import normalizeRegion, planRegions, getSourceSlices, getRegionSlices
+from .stageTimer import StageTimer, measureStage
+from .coarseToFine import getFlameValues, getRegionExtents, DEFAULT_TILE_SIZE
+from .maskArchive import packMasks
+
+# Each compiled flame table is 2 MB
+MAX_CACHED_FLAME_TABLES = 16
+
+# analyzeFrames works through blocks of at most this many pixels (or one
+# frame) at a time. The uint32 RGB index and masks of bigger blocks don't
+# stay in the CPU cache, which makes every frame slower.
+MAX_BLOCK_PIXELS = 1 << 19
+
+# The config keys analyzeFrames results depend on
+ANALYSIS_CONFIG_KEYS = ["crop", "secondCropBox", "mirror", "h", "s", "v"]
+
+# The columnar results of analyzeFrames, besides the optional masks
+RESULT_KEYS = ["highestXPos", "lowestXPos", "boundingBoxWithSecondCropBox", "flameTipCoordinates"]
+
+# Optional config keys analyzeFrames results also depend on, with their defaults
+COMPONENT_FILTER_DEFAULTS = {"minComponentArea": 0, "keepLargestComponent": False}
+
+
+def getComponentFilter(config):
+    """
+    The component filter settings of config, None when it doesn't filter anything
+    """
+    componentFilter = {key: config.get(key, default) for key, default in COMPONENT_FILTER_DEFAULTS.items()}
+    if componentFilter["minComponentArea"] <= 1 and not componentFilter["keepLargestComponent"]:
+        return None
+
+    return componentFilter
+
+
+def concatenateResults(blocks):
+    """
+    Columnar results of consecutive blocks of frames joined into one
+    """
+    blocks = list(blocks)
+    return {key: np.concatenate([block[key] for block in blocks]) for key in blocks[0]}
+
+
+def getFramesPerBlock(frameShape):
+    """
+    Frames of frameShape in a block of at most MAX_BLOCK_PIXELS pixels, at least one
+    """
+    return max(1, MAX_BLOCK_PIXELS // max(1, frameShape[0] * frameShape[1]))
+
+
+def firstTrueIndex(array: np.ndarray):
+    """Index of the first True value in a 1D boolean array"""
+    return array.argmax()
+
+
+def lastTrueIndex(array: np.ndarray):
+    """Index of the last True value in a 1D boolean array"""
+    return len(array) - 1 - array[::-1].argmax()
 
 
 class HSVMaskAnalyzer:
+    def __init__(self):
+        # Memory-mapped RGB to HSV table, loaded on first use
+        self.hsvLookup = None
+
+        # Compiled "is flame" tables keyed by the h, s, v ranges,
+        # least recently used first
+        self.flameTables = OrderedDict()
+
+        # getFlameValues of the compiled tables, same keys
+        self.flameValues = OrderedDict()
+
+    def getHsvLookup(self):
+        if self.hsvLookup is None:
+            self.hsvLookup = load_rgb_to_hsv_lookup()
+
+        return self.hsvLookup
+
+    def getHsvFrame(self, frame: np.ndarray):
+        """
+        Convert an RGB frame to HSV scaled 0 to 1.
+        uint8 frames go through the precomputed lookup table,
+        anything else falls back to skimage's rgb2hsv.
+        """
+        if frame.dtype != np.uint8 or frame.shape[-1] != 3:
+            return rgb2hsv(frame)
+
+        return rgb_to_hsv(frame, self.getHsvLookup())
+
+    def getFlameTable(
+        self,
+        h: tuple[float, float],
+        s: tuple[float, float],
+        v: tuple[float, float],
+    ):
+        """
+        Get the bit-packed "is flame" table for these HSV ranges,
+        compiling it the first time the ranges are seen.
+        """
+        key = tuple(tuple(map(float, hsvRange)) for hsvRange in (h, s, v))
+
+        if key in self.flameTables:
+            self.flameTables.move_to_end(key)
+            return self.flameTables[key]
+
+        flameTable = compileFlameTable(*key, self.getHsvLookup())
+
+        self.flameTables[key] = flameTable
+        if len(self.flameTables) > MAX_CACHED_FLAME_TABLES:
+            self.flameTables.popitem(last=False)
+
+        return flameTable
+
+    def getFlameValues(
+        self,
+        h: tuple[float, float],
+        s: tuple[float, float],
+        v: tuple[float, float],
+    ):
+        """
+        Which max(r, g, b) values flame colours for these HSV ranges have,
+        for the coarse pass of coarseToFine
+        """
+        key = tuple(tuple(map(float, hsvRange)) for hsvRange in (h, s, v))
+
+        if key in self.flameValues:
+            self.flameValues.move_to_end(key)
+            return self.flameValues[key]
+
+        flameValues = getFlameValues(self.getFlameTable(h, s, v))
+
+        self.flameValues[key] = flameValues
+        if len(self.flameValues) > MAX_CACHED_FLAME_TABLES:
+            self.flameValues.popitem(last=False)
+
+        return flameValues
+
     def getMask(
         self,
         h: tuple[float, float],  # min, max, from 0 to 1
@@ -12,8 +157,13 @@ class HSVMaskAnalyzer:
         v: tuple[float, float],
         frame: np.ndarray,
     ):
+        # uint8 RGB frames skip the HSV conversion and are
+        # looked up in the compiled table directly
+        if frame.dtype == np.uint8 and frame.shape[-1] == 3:
+            return self.getMaskFromRgbIndex(h, s, v, rgb_to_flat_index(frame))
+
         # Convert to HSV
-        hsvFrame = rgb2hsv(frame)
+        hsvFrame = self.getHsvFrame(frame)
 
         # By this point, hsvFrame is HSV scaled 0 to 1
 
@@ -22,6 +172,81 @@ class HSVMaskAnalyzer:
 
         return mask
 
+    def getMaskFromRgbIndex(
+        self,
+        h: tuple[float, float],
+        s: tuple[float, float],
+        v: tuple[float, float],
+        rgbIndex: np.ndarray,
+    ):
+        """
+        getMask for a frame already packed with rgb_to_flat_index
+        """
+        return getFlameMaskFromTable(self.getFlameTable(h, s, v), rgbIndex)
+
+    def getRegionMasks(
+        self,
+        frame: np.ndarray,
+        regions: List[List[int]],
+        mirror: bool,
+        h: tuple[float, float],
+        s: tuple[float, float],
+        v: tuple[float, float],
+        timer: StageTimer = None,
+    ):
+        """
+        Get the cropped frame and mask for each [top, bottom, left, right]
+        region. Regions are in mirrored coordinates when mirror is set.
+        Overlapping regions are thresholded once over their bounding box,
+        and every returned frame and mask is a view into that.
+        frame can also be a stack of frames shaped (N, H, W, 3).
+        """
+        frame = np.asarray(frame)
+        frameShape = frame.shape[-3:-1]
+        regions = [normalizeRegion(region, frameShape) for region in regions]
+
+        frames = [None] * len(regions)
+        masks = [None] * len(regions)
+
+        for groupRegion, indices in planRegions(regions):
+            # Mirroring is only a remap of the columns,
+            # the full frame never gets flipped
+            rows, cols = getSourceSlices(groupRegion, frameShape[1], mirror)
+            groupFrame = frame[..., rows, cols, :]
+
+            if groupFrame.dtype == np.uint8 and groupFrame.shape[-1] == 3:
+                # The RGB index takes the place of the HSV conversion
+                with measureStage(timer, "rgbIndex"):
+                    rgbIndex = rgb_to_flat_index(groupFrame)
+                with measureStage(timer, "threshold"):
+                    groupMask = self.getMaskFromRgbIndex(h, s, v, rgbIndex)
+            else:
+                with measureStage(timer, "threshold"):
+                    groupMask = self.getMask(h, s, v, groupFrame)
+
+            if mirror:
+                groupFrame = groupFrame[..., ::-1, :]
+                groupMask = groupMask[..., ::-1]
+
+            for i in indices:
+                rows, cols = getRegionSlices(groupRegion, regions[i])
+                frames[i] = groupFrame[..., rows, cols, :]
+                masks[i] = groupMask[..., rows, cols]
+
+        return frames, masks
+
+    def filterMasks(self, masks: np.ndarray, config, timer: StageTimer = None):
+        """
+        masks with the small components removed, or only the largest one kept,
+        as set by minComponentArea and keepLargestComponent in config
+        """
+        componentFilter = getComponentFilter(config)
+        if componentFilter is None:
+            return masks
+
+        with measureStage(timer, "componentFilter"):
+            return filterFlameComponents(masks, **componentFilter)
+
     def getHighestXPosFromContoursBigArray(self, contoursBigArray: np.ndarray):
         """
         Get the highest x position of the contours.
@@ -31,123 +256,300 @@ class HSVMaskAnalyzer:
         print("WARNING: getHighestXPosFromContoursBigArray is deprecated. Use getHighestXPosFromBinaryMask instead.")
         return contoursBigArray[:, 1].max()
 
+    def getExtentsFromBinaryMask(self, mask: np.ndarray):
+        """
+        Get every per-frame extent of the binary mask in a single pass.
+        Uses row and column any() projections, so no coordinate arrays are made.
+        Returns a dict with:
+            boundingBox: [min y, max y, min x, max x]
+            highestXPos, lowestXPos: max and min x
+            flameTip: [x, y], the rightmost pixel in the top row of the mask
+        Everything is 0 when the mask is empty.
+        """
+        rowsWithFlame = mask.any(axis=1)
+
+        # If there are no True values, return 0
+        if not rowsWithFlame.any():
+            return {
+                "boundingBox": [0, 0, 0, 0],
+                "highestXPos": 0,
+                "lowestXPos": 0,
+                "flameTip": [0, 0],
+            }
+
+        top = firstTrueIndex(rowsWithFlame)
+        bottom = lastTrueIndex(rowsWithFlame)
+
+        # Only rows between top and bottom can have flame in them
+        colsWithFlame = mask[top : bottom + 1].any(axis=0)
+        left = firstTrueIndex(colsWithFlame)
+        right = lastTrueIndex(colsWithFlame)
+
+        return {
+            "boundingBox": [top, bottom, left, right],
+            "highestXPos": right,
+            "lowestXPos": left,
+            "flameTip": [lastTrueIndex(mask[top]), top],
+        }
+
+    def getExtentsFromBinaryMasks(self, masks: np.ndarray):
+        """
+        Vectorized getExtentsFromBinaryMask for a stack of masks shaped (N, H, W).
+        Returns the same keys as columnar int64 arrays: boundingBox (N, 4),
+        highestXPos (N,), lowestXPos (N,) and flameTip (N, 2).
+        """
+        count, height, width = masks.shape
+        extents = {
+            "boundingBox": np.zeros((count, 4), dtype=np.int64),
+            "highestXPos": np.zeros(count, dtype=np.int64),
+            "lowestXPos": np.zeros(count, dtype=np.int64),
+            "flameTip": np.zeros((count, 2), dtype=np.int64),
+        }
+
+        rowsWithFlame = masks.any(axis=2)
+        hasFlame = rowsWithFlame.any(axis=1)
+
+        # Empty masks stay 0
+        if not hasFlame.any():
+            return extents
+
+        colsWithFlame = masks.any(axis=1)
+
+        top = rowsWithFlame.argmax(axis=1)
+        bottom = height - 1 - rowsWithFlame[:, ::-1].argmax(axis=1)
+        left = colsWithFlame.argmax(axis=1)
+        right = width - 1 - colsWithFlame[:, ::-1].argmax(axis=1)
+
+        # Rightmost pixel in the top row of each mask
+        topRows = masks[np.arange(count), top]
+        flameTipX = width - 1 - topRows[:, ::-1].argmax(axis=1)
+
+        extents["boundingBox"][hasFlame] = np.stack(
+            [top, bottom, left, right], axis=1
+        )[hasFlame]
+        extents["highestXPos"][hasFlame] = right[hasFlame]
+        extents["lowestXPos"][hasFlame] = left[hasFlame]
+        extents["flameTip"][hasFlame] = np.stack([flameTipX, top], axis=1)[hasFlame]
+
+        return extents
+
     def getHighestXPosFromBinaryMask(self, mask: np.ndarray):
         """
         Get the highest x position using the binary mask.
         mask should be a boolean numpy array.
         """
-        # Find the indices of the True values
-        indices = np.where(mask)
-
-        # If there are no True values, return 0
-        if len(indices[1]) == 0:
-            return 0
+        return self.getExtentsFromBinaryMask(mask)["highestXPos"]
 
-        # Get the highest index on the X axis
-        return indices[1].max()
-    
     def getLowestXPosFromBinaryMask(self, mask: np.ndarray):
         """
         Get the lowest x position using the binary mask.
         mask should be a boolean numpy array.
         """
-        # Find the indices of the True values
-        indices = np.where(mask)
-
-        # If there are no True values, return 0
-        if len(indices[1]) == 0:
-            return 0
+        return self.getExtentsFromBinaryMask(mask)["lowestXPos"]
 
-        # Get the lowest index on the X axis
-        return indices[1].min()
-    
     def getBoundingBoxFromBinaryMask(self, mask: np.ndarray):
         """
         Get the bounding box of the mask.
         mask should be a boolean numpy array.
         """
-        # Find the indices of the True values
-        indices = np.where(mask)
+        return self.getExtentsFromBinaryMask(mask)["boundingBox"]
 
-        # If there are no True values, return 0
-        if len(indices[1]) == 0:
-            return [0, 0, 0, 0]
-
-        # Get the bounding box
-        return [
-            indices[0].min(),
-            indices[0].max(),
-            indices[1].min(),
-            indices[1].max(),
-        ]
-    
     def getFlameTipFromBinaryMaskAndBoundaryBox(self, mask: np.ndarray, boundaryBoxMaxY: int) -> list[int]:
         """
         Get the flame tip coordinates by taking the boundary box max y,
         and finding the pixel with the highest x value in that row.
         """
-        # Get the indices of the True values
-        indices = np.where(mask)
-
-        # If there are no True values, return 0
-        if len(indices[1]) == 0:
-            return [0, 0]
-
-        # Get the indices where the y value is the boundaryBoxMaxY
-        indicesMaxY = np.where(indices[0] == boundaryBoxMaxY)
-
-        # If there are no True values, return 0
-        if len(indicesMaxY[0]) == 0:
+        # If the row is outside the mask or has no True values, return 0
+        if not 0 <= boundaryBoxMaxY < mask.shape[0] or not mask[boundaryBoxMaxY].any():
             return [0, 0]
 
         # Get the highest x value in the row
-        return [indices[1][indicesMaxY[0]].max(), boundaryBoxMaxY]
+        return [lastTrueIndex(mask[boundaryBoxMaxY]), boundaryBoxMaxY]
 
-    def completelyAnalyzeFrame(
+    def analyzeFullFrameMask(
         self,
-        frame: np.ndarray,
+        fullMask: np.ndarray,
         crop: List[int],
         secondCropBox: List[int],
         mirror: bool,
-        h: tuple[float, float],
-        s: tuple[float, float],
-        v: tuple[float, float],
+        minComponentArea: int = 0,
+        keepLargestComponent: bool = False,
     ):
-        # Mirror the frame if needed
-        if mirror:
-            frame = np.flip(frame, axis=1)
+        """
+        Same results as completelyAnalyzeFrame, minus the cropped frame,
+        from a mask of the whole unmirrored frame. Cropping and mirroring
+        are only views, so this is cheap to redo when just they change.
+        The component filter is applied to the cropped masks like in analyzeFrames.
+        Returns (mask, highestXPos, boundingBoxWithSecondCropBox,
+        maskWithSecondCropBox, lowestXPos, flameTipCoordinates)
+        """
+        masks = []
+        for region in [secondCropBox, crop]:
+            region = normalizeRegion(region, fullMask.shape)
+            rows, cols = getSourceSlices(region, fullMask.shape[1], mirror)
+            mask = fullMask[rows, cols]
+            masks.append(mask[:, ::-1] if mirror else mask)
 
-        frameWithSecondCropBox = frame[
-            secondCropBox[0] : secondCropBox[1],
-            secondCropBox[2] : secondCropBox[3],
-            :,
-        ]
+        componentFilter = {"minComponentArea": minComponentArea, "keepLargestComponent": keepLargestComponent}
+        maskWithSecondCropBox, mask = (self.filterMasks(mask, componentFilter) for mask in masks)
 
-        maskWithSecondCropBox = self.getMask(h, s, v, frameWithSecondCropBox) 
+        extentsWithSecondCropBox = self.getExtentsFromBinaryMask(maskWithSecondCropBox)
+        extents = self.getExtentsFromBinaryMask(mask)
 
-        # Crop the frame
-        frame = frame[
-            crop[0] : crop[1],
-            crop[2] : crop[3],
-            :,
-        ]
+        return (
+            mask,
+            extents["highestXPos"],
+            extentsWithSecondCropBox["boundingBox"],
+            maskWithSecondCropBox,
+            extents["lowestXPos"],
+            extentsWithSecondCropBox["flameTip"],
+        )
 
-        # By this point, frame should be an RGB scaled 0-255
+    def analyzeFrames(
+        self,
+        stack: np.ndarray,
+        config,
+        returnMasks: bool = False,
+        timer: StageTimer = None,
+    ):
+        """
+        Analyze a block of frames shaped (N, H, W, 3), e.g. a chunk of the
+        reader's dask array. Cropping, thresholding and extents are done
+        across up to MAX_BLOCK_PIXELS pixels of it at once.
+        config needs crop, secondCropBox, mirror, h, s and v.
+        Returns a dict of columnar arrays, one row per frame:
+            highestXPos, lowestXPos: (N,) from the crop mask
+            boundingBoxWithSecondCropBox: (N, 4) from the second crop box mask
+            flameTipCoordinates: (N, 2) from the second crop box mask
+        With returnMasks, frames, masks and masksWithSecondCropBox are
+        included too, as views of the cropped (and mirrored) block.
+        Stage times are added to timer when given.
+        With minComponentArea or keepLargestComponent set, the masks go
+        through filterFlameComponents before the extents are taken.
+        With coarseToFine set, uint8 RGB blocks only get thresholded where
+        it can change the extents (see coarseToFine), same results. The
+        component filter and the mask archive need every pixel of the mask,
+        so not with those.
+        With maskArchive set, packedMasks and maskShapes are added too,
+        see maskArchive.packMasks.
+        """
+        stack = np.asarray(stack)
+
+        # The returned masks are views of the whole block, so only without them
+        framesPerBlock = getFramesPerBlock(stack.shape[1:3])
+        if not returnMasks and len(stack) > framesPerBlock:
+            return concatenateResults(
+                self.analyzeFrames(stack[start : start + framesPerBlock], config, timer=timer)
+                for start in range(0, len(stack), framesPerBlock)
+            )
+
+        if (
+            config.get("coarseToFine", False)
+            and getComponentFilter(config) is None
+            and not config.get("maskArchive", False)
+            and not returnMasks
+            and stack.dtype == np.uint8
+            and stack.shape[-1] == 3
+        ):
+            return self.analyzeFramesCoarseToFine(stack, config, timer)
+
+        # Mask both crop boxes, sharing the work where they overlap
+        (_, frames), (masksWithSecondCropBox, masks) = self.getRegionMasks(
+            stack,
+            [config["secondCropBox"], config["crop"]],
+            config["mirror"],
+            config["h"],
+            config["s"],
+            config["v"],
+            timer,
+        )
+
+        # Embers and reflections away from the flame
+        masksWithSecondCropBox = self.filterMasks(masksWithSecondCropBox, config, timer)
+        masks = self.filterMasks(masks, config, timer)
+
+        with measureStage(timer, "extents"):
+            # Get bounding box and flame tip of mask WITHOUT CROP
+            extentsWithSecondCropBox = self.getExtentsFromBinaryMasks(masksWithSecondCropBox)
+
+            # Get the highest and lowest x position of the mask
+            extents = self.getExtentsFromBinaryMasks(masks)
+
+        results = {
+            "highestXPos": extents["highestXPos"],
+            "lowestXPos": extents["lowestXPos"],
+            "boundingBoxWithSecondCropBox": extentsWithSecondCropBox["boundingBox"],
+            "flameTipCoordinates": extentsWithSecondCropBox["flameTip"],
+        }
 
-        # Get mask and contours
-        # TODO: Area filter
-        mask = self.getMask(h, s, v, frame)
+        if config.get("maskArchive", False):
+            with measureStage(timer, "packMasks"):
+                results["packedMasks"], results["maskShapes"] = packMasks(masksWithSecondCropBox, masks)
 
-        # Get bounding box of mask WITHOUT CROP
-        boundingBoxWithSecondCropBox = self.getBoundingBoxFromBinaryMask(maskWithSecondCropBox)
+        if returnMasks:
+            results["frames"] = frames
+            results["masks"] = masks
+            results["masksWithSecondCropBox"] = masksWithSecondCropBox
 
-        # Get the flame tip coordinates
-        flameTipCoordinates = self.getFlameTipFromBinaryMaskAndBoundaryBox(maskWithSecondCropBox, boundingBoxWithSecondCropBox[0])
+        return results
 
-        # Get the highest x position of the mask
-        highestXPos = self.getHighestXPosFromBinaryMask(mask)
+    def analyzeFramesCoarseToFine(self, stack: np.ndarray, config, timer: StageTimer = None):
+        """
+        analyzeFrames results for a uint8 RGB block, without masking every pixel
+        """
+        h, s, v = config["h"], config["s"], config["v"]
+        flameTable = self.getFlameTable(h, s, v)
+        flameValues = self.getFlameValues(h, s, v)
+        tileSize = config.get("coarseTileSize", DEFAULT_TILE_SIZE)
+
+        extentsWithSecondCropBox, extents = (
+            getRegionExtents(stack, config[key], config["mirror"], flameTable, flameValues, tileSize, timer)
+            for key in ["secondCropBox", "crop"]
+        )
+
+        return {
+            "highestXPos": extents["highestXPos"],
+            "lowestXPos": extents["lowestXPos"],
+            "boundingBoxWithSecondCropBox": extentsWithSecondCropBox["boundingBox"],
+            "flameTipCoordinates": extentsWithSecondCropBox["flameTip"],
+        }
+
+    def completelyAnalyzeFrame(
+        self,
+        frame: np.ndarray,
+        crop: List[int],
+        secondCropBox: List[int],
+        mirror: bool,
+        h: tuple[float, float],
+        s: tuple[float, float],
+        v: tuple[float, float],
+        minComponentArea: int = 0,
+        keepLargestComponent: bool = False,
+    ):
+        # Analyze as a block of one frame
+        results = self.analyzeFrames(
+            np.asarray(frame)[np.newaxis],
+            {
+                "crop": crop,
+                "secondCropBox": secondCropBox,
+                "mirror": mirror,
+                "h": h,
+                "s": s,
+                "v": v,
+                "minComponentArea": minComponentArea,
+                "keepLargestComponent": keepLargestComponent,
+            },
+            returnMasks=True,
+        )
+
+        # By this point, frame should be an RGB scaled 0-255
+        frame = results["frames"][0]
+        mask = results["masks"][0]
+        maskWithSecondCropBox = results["masksWithSecondCropBox"][0]
 
-        # Get the lowest x position of the mask
-        lowestXPos = self.getLowestXPosFromBinaryMask(mask)
+        highestXPos = results["highestXPos"][0]
+        lowestXPos = results["lowestXPos"][0]
+        boundingBoxWithSecondCropBox = list(results["boundingBoxWithSecondCropBox"][0])
+        flameTipCoordinates = list(results["flameTipCoordinates"][0])
 
         return frame, mask, highestXPos, boundingBoxWithSecondCropBox, maskWithSecondCropBox, lowestXPos, flameTipCoordinates
@@ -0,0 +1,112 @@
+import time
+import numpy as np
+from .HSVMaskAnalyzer import HSVMaskAnalyzer, RESULT_KEYS, concatenateResults
+from .stageTimer import StageTimer
+
+
+def analyzeFrameIndices(
+    analyzer: HSVMaskAnalyzer, frames, indices, config, timer: StageTimer = None
+):
+    """
+    Columnar analyzeFrames results for frames[indices] of a random access sequence
+    """
+    start = time.perf_counter()
+    stack = np.stack([np.asarray(frames[int(index)]) for index in indices])
+    if timer is not None:
+        timer.add("decode", time.perf_counter() - start, len(indices))
+
+    return analyzer.analyzeFrames(stack, config, timer=timer)
+
+
+def findAnalysisWindow(
+    analyzer: HSVMaskAnalyzer, frames, config, probeCount: int, timer: StageTimer = None
+):
+    """
+    Find the frames postProcess.autoCrop keeps, without analyzing them all.
+
+    probeCount evenly spaced frames are analyzed first. The first frame with
+    flame is then found by bisecting between the last probe without flame and
+    the first probe with it. The leading edge can peak anywhere between the
+    probes around the highest probe, so the window runs up to the probe after it.
+    Assumes there is no flame before ignition and that the leading edge
+    doesn't peak between two lower probes.
+
+    Returns (start, stop), start == stop when no probe saw flame.
+    """
+    frameCount = len(frames)
+    if frameCount == 0:
+        return 0, 0
+
+    chunkSize = config.get("chunkSize", 16)
+
+    probes = np.unique(np.linspace(0, frameCount - 1, min(probeCount, frameCount)).round().astype(np.int64))
+    highestXPos = np.concatenate(
+        [
+            analyzeFrameIndices(analyzer, frames, probes[i : i + chunkSize], config, timer)["highestXPos"]
+            for i in range(0, len(probes), chunkSize)
+        ]
+    )
+
+    withFlame = np.flatnonzero(highestXPos > 0)
+    if len(withFlame) == 0:
+        return 0, 0
+
+    # Bisect for ignition, lo never has flame and hi always has
+    firstProbe = withFlame[0]
+    lo = probes[firstProbe - 1] if firstProbe > 0 else -1
+    hi = probes[firstProbe]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if analyzeFrameIndices(analyzer, frames, [mid], config, timer)["highestXPos"][0] > 0:
+            hi = mid
+        else:
+            lo = mid
+
+    # argmax, like autoCrop, so the first of equally high probes
+    maxProbe = highestXPos.argmax()
+    stop = probes[maxProbe + 1] + 1 if maxProbe + 1 < len(probes) else frameCount
+
+    return int(hi), int(stop)
+
+
+def iterWindowResults(
+    analyzer: HSVMaskAnalyzer,
+    frames,
+    start: int,
+    stop: int,
+    config,
+    flatStep: int,
+    timer: StageTimer = None,
+):
+    """
+    Results for frames start to stop of a random access sequence, in order,
+    one block of up to flatStep frames at a time.
+    Only the last frame of a block is analyzed first. When its results are
+    identical to the last frame of the previous block, nothing moved and
+    every frame in between gets the same results; otherwise the whole block
+    is analyzed. Yields the columnar results of every block.
+    """
+    chunkSize = config.get("chunkSize", 16)
+    previous = None
+
+    for blockStart in range(start, stop, flatStep):
+        blockStop = min(blockStart + flatStep, stop)
+        last = analyzeFrameIndices(analyzer, frames, [blockStop - 1], config, timer)
+
+        if previous is not None and all(
+            np.array_equal(last[key][0], previous[key][0]) for key in RESULT_KEYS
+        ):
+            # The packed masks too when there are any, approximate like the rest of the block
+            blockLength = blockStop - blockStart
+            yield {key: np.repeat(last[key], blockLength, axis=0) for key in last}
+        else:
+            # chunkSize frames at a time, like the dense analysis
+            blocks = [
+                analyzeFrameIndices(
+                    analyzer, frames, range(i, min(i + chunkSize, blockStop - 1)), config, timer
+                )
+                for i in range(blockStart, blockStop - 1, chunkSize)
+            ]
+            yield concatenateResults([*blocks, last])
+
+        previous = last
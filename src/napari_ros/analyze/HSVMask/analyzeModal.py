@@ -1,21 +1,15 @@
-import time
-from qtpy.QtCore import QTimer
-from qtpy.QtWidgets import QDialog, QWidget, QLabel, QGridLayout
-from .HSVMaskAnalyzer import HSVMaskAnalyzer
+from qtpy.QtWidgets import QDialog, QWidget, QLabel, QGridLayout, QPushButton
 from napari.qt.threading import thread_worker
-from pims import ImageSequence
-import os
-
-# Should produce the same results re-initializing the analyzer
-# here
-# TODO: Find a better way to do this
-analyzer = HSVMaskAnalyzer()
-
-from .postProcess import postProcess
+from .frameSources import getTitle
+from .batchAnalysis import analyzeInput
 
 
 @thread_worker
 def analyzeImageSequence():
+    """
+    imageSequenceDirectory can also be the path to a video file,
+    which is then decoded while it is analyzed.
+    """
     status = "checking arguments..."
     arguments = {}
 
@@ -31,53 +25,8 @@ def analyzeImageSequence():
         except:
             continue
 
-    # Make directory ../data/config["title"] (starting from imageSequenceDirectory)
-    dataExportDir = os.path.join(imageSequenceDirectory, os.pardir, "data", title)
-    os.makedirs(dataExportDir, exist_ok=True)
-
-    status = "reading image sequence"
-    yield status
-
-    images = ImageSequence(imageSequenceDirectory)
-
-    # The index for these lists is the frame number
-    highestXPos = []
-    lowestXPos = []
-    boundingBoxWithSecondCropBox = []
-    flameTipCoordinates = []
-
-    for image in images:
-        (
-            frame,
-            mask,
-            highestXPosForThisFrame,
-            boundingBoxWithSecondCropBoxForThisFrame,
-            maskWithSecondCropBox,
-            lowestXPosForThisFrame,
-            flameTipCoordinatesForThisFrame,
-        ) = analyzer.completelyAnalyzeFrame(
-            image,
-            config["crop"],
-            config["secondCropBox"],
-            config["mirror"],
-            config["h"],
-            config["s"],
-            config["v"],
-        )
-
-        highestXPos.append(highestXPosForThisFrame)
-        lowestXPos.append(lowestXPosForThisFrame)
-        flameTipCoordinates.append(flameTipCoordinatesForThisFrame)
-        boundingBoxWithSecondCropBox.append(boundingBoxWithSecondCropBoxForThisFrame)
-        status = f"analyzing frame {len(highestXPos)}"
-        yield status
-
-    status = "post processing data"
-    yield status
-
-    postProcess(highestXPos, boundingBoxWithSecondCropBox, config, arguments["title"], dataExportDir, lowestXPos, flameTipCoordinates)
-
-    return
+    # Cancelling is sent through to analyzeInput
+    return (yield from analyzeInput(imageSequenceDirectory, config, title))
 
 
 class AnalyzeModal(QDialog):
@@ -98,7 +47,18 @@ class AnalyzeModal(QDialog):
         # Make the window a bit bigger
         self.resize(400, 100)
 
-        layout.addWidget(self.statusLabel)
+        layout.addWidget(self.statusLabel, 0, 0, 1, 2)
+
+        # Pausing and cancelling take effect between two chunks of frames.
+        # Everything analyzed so far is kept in the checkpoint
+        self.pauseButton = QPushButton("Pause")
+        self.pauseButton.clicked.connect(self.togglePause)
+        layout.addWidget(self.pauseButton, 1, 0)
+
+        self.cancelButton = QPushButton("Cancel")
+        self.cancelButton.clicked.connect(self.cancel)
+        layout.addWidget(self.cancelButton, 1, 1)
+
         self.setLayout(layout)
 
         # Initialize the worker
@@ -106,6 +66,8 @@ class AnalyzeModal(QDialog):
         self.worker.yielded.connect(self.on_yielded)
         self.worker.returned.connect(self.on_return)
         self.worker.started.connect(self.start_analysis)
+        self.worker.paused.connect(lambda: self.statusLabel.setText("paused"))
+        self.worker.finished.connect(self.on_finished)
         self.worker.start()
 
     def start_analysis(self):
@@ -115,12 +77,41 @@ class AnalyzeModal(QDialog):
     def on_yielded(self, value):
         self.statusLabel.setText(value)
 
-    def on_return(self):
-        self.statusLabel.setText("done")
+    def on_return(self, value=None):
+        # A cancelled run returns why it stopped
+        self.statusLabel.setText(value or "done")
+
+    def on_finished(self):
+        self.pauseButton.setEnabled(False)
+        self.cancelButton.setEnabled(False)
+
+    def togglePause(self):
+        if self.worker.is_paused:
+            self.worker.resume()
+            self.pauseButton.setText("Pause")
+        else:
+            self.worker.pause()
+            self.pauseButton.setText("Resume")
+
+    def cancel(self):
+        if not self.worker.is_running:
+            return
+
+        self.statusLabel.setText("cancelling")
+        self.worker.send("cancel")
+
+        # A paused worker has to run again to see it
+        if self.worker.is_paused:
+            self.worker.resume()
+
+    def reject(self):
+        # Closing the dialog stops the analysis too
+        self.cancel()
+        super().reject()
 
     def send_next_value(self, config, imageSequenceDirectory):
-        # title should be the name of the directory only 
-        titleOfPostProcess = os.path.basename(imageSequenceDirectory)
+        # title should be the name of the directory (or video) only
+        titleOfPostProcess = getTitle(imageSequenceDirectory)
         self.worker.send(
             {
                 "config": config,
@@ -0,0 +1,272 @@
+"""
+Batch analysis of an image sequence or video, without napari or Qt,
+shared by the Analyze button and the napari-ros command line.
+"""
+import itertools
+import json
+import os
+import time
+from .HSVMaskAnalyzer import HSVMaskAnalyzer
+from .parallelAnalysis import analyzeFramesInChunks, analyzeFramesInParallel
+from .frameSources import openFrames, openIndexedFrames, countFrames, getTitle, getDataExportDir
+from .adaptiveSampling import findAnalysisWindow, iterWindowResults
+from .resultStore import ResultStore
+from .maskArchive import MaskArchiveWriter
+from .checkpoint import AnalysisCheckpoint
+from .postProcess import postProcess
+from .export import checkExportFormats
+from .stageTimer import StageTimer
+from .types import HSVMaskConfigType
+
+# Seconds between two progress updates
+STATUS_INTERVAL = 0.25
+
+# Should produce the same results re-initializing the analyzer
+# here
+# TODO: Find a better way to do this
+analyzer = HSVMaskAnalyzer()
+
+
+def getDefaultConfig() -> HSVMaskConfigType:
+    """
+    Config used for anything a saved config doesn't set (everything but layer)
+    """
+    return {
+        "crop": [960, 987, 511, 1496],
+        "secondCropBox": [360, 987, 511, 1496],
+        "mirror": True,
+        "h": [0.0, 0.32407407407407407],
+        "s": [0.0, 0.6620370370370371],
+        "v": [0.9, 1.0],
+        "pixelsInUnit": 104,
+        "cmApart": 4.5,
+        "fps": 59.94,
+        "minComponentArea": 0,
+        "keepLargestComponent": False,
+        "workers": 1,
+        "chunkSize": 16,
+        "exportFormats": [],
+        "adaptiveSampling": False,
+        "samplingProbes": 64,
+        "samplingFlatStep": 1,
+        "frontTracking": False,
+        "trackingMargin": 32,
+        "trackingRefreshFrames": 60,
+        "coarseToFine": False,
+        "coarseTileSize": 16,
+        "maskArchive": False,
+    }
+
+
+def loadConfig(path: str) -> HSVMaskConfigType:
+    """
+    Read a config saved by saveConfigToUserSettings (napari_ros_last_config.json),
+    filling in anything missing from the defaults
+    """
+    with open(path) as f:
+        savedConfig = json.load(f)
+
+    return {**getDefaultConfig(), **savedConfig}
+
+
+def formatDuration(seconds: float):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def getProgressStatus(completedFrames: int, totalFrames: int, framesThisRun: int, elapsed: float):
+    """
+    "analyzing frame N/total, X frames/s, ETA m:ss"
+    """
+    status = f"analyzing frame {completedFrames}"
+    if totalFrames:
+        status += f"/{totalFrames}"
+
+    if elapsed > 0 and framesThisRun > 0:
+        framesPerSecond = framesThisRun / elapsed
+        status += f", {framesPerSecond:.1f} frames/s"
+
+        if totalFrames:
+            remaining = max(totalFrames - completedFrames, 0)
+            status += f", ETA {formatDuration(remaining / framesPerSecond)}"
+
+    return status
+
+
+def analyzeInput(inputPath: str, config: HSVMaskConfigType, title: str = None):
+    """
+    Analyze an image sequence directory or video and post process it into
+    data/<title> next to it. A generator yielding status text, with the
+    progress at most every STATUS_INTERVAL seconds.
+
+    Sending "cancel" stops at the next status; the frames done so far stay
+    in the checkpoint and the next run with the same input and config
+    resumes from there. Returns a message when cancelled.
+    """
+    # Unknown formats or a missing pyarrow would otherwise only fail after the analysis
+    checkExportFormats(config.get("exportFormats", []))
+
+    if title is None:
+        title = getTitle(inputPath)
+
+    # Make directory ../data/config["title"] (starting from imageSequenceDirectory)
+    dataExportDir = getDataExportDir(inputPath, title)
+    os.makedirs(dataExportDir, exist_ok=True)
+
+    # Time spent in every stage, saved in metadata.json
+    timer = StageTimer()
+    runStart = time.perf_counter()
+
+    # Frames windowStart to windowStop are analyzed, every frame by default
+    windowStart, windowStop = 0, countFrames(inputPath)
+    sampling = None
+    indexedFrames = None
+
+    if config.get("adaptiveSampling", False):
+        command = yield "looking for ignition and the end of the burn"
+
+        indexedFrames = openIndexedFrames(inputPath)
+        windowStart, windowStop = findAnalysisWindow(
+            analyzer, indexedFrames, config, config.get("samplingProbes", 64), timer
+        )
+        sampling = {
+            "mode": "adaptive",
+            "totalFrames": len(indexedFrames),
+            "window": [windowStart, windowStop],
+            "probes": config.get("samplingProbes", 64),
+            "flatStep": config.get("samplingFlatStep", 1),
+        }
+
+    # Per-frame results are appended to a checkpoint as they come in.
+    # Running the same input and config again resumes after the last frame
+    checkpoint = AnalysisCheckpoint(
+        os.path.join(dataExportDir, "checkpoint"), inputPath, config, sampling
+    )
+    startFrame = windowStart + checkpoint.openForAppend()
+
+    # Every frame's masks, when asked for. Written before the checkpoint,
+    # so resuming never skips frames the archive doesn't have
+    maskArchive = None
+    if config.get("maskArchive", False):
+        maskArchive = MaskArchiveWriter(dataExportDir, resume=startFrame > windowStart)
+
+        # Without the masks of the frames done so far the archive would have a gap
+        if maskArchive.resume and not maskArchive.canResume(startFrame):
+            checkpoint.restart()
+            startFrame = windowStart
+            maskArchive.resume = False
+
+    if startFrame > windowStart:
+        status = f"resuming after frame {startFrame}"
+    else:
+        status = "reading frames"
+    command = yield status
+
+    workers = config.get("workers", 1)
+    chunkSize = config.get("chunkSize", 16)
+    if sampling is not None and sampling["flatStep"] > 1:
+        frameResults = iterWindowResults(
+            analyzer, indexedFrames, startFrame, windowStop, config, sampling["flatStep"], timer
+        )
+    else:
+        images = openFrames(inputPath, startFrame)
+        if sampling is not None:
+            images = itertools.islice(images, windowStop - startFrame)
+
+        if workers > 1:
+            frameResults = analyzeFramesInParallel(images, config, workers, chunkSize, timer)
+        else:
+            frameResults = analyzeFramesInChunks(analyzer, images, config, chunkSize, timer)
+
+    lastStatus = time.perf_counter()
+    analysisStart = lastStatus
+
+    try:
+        # "cancel" is sent to stop between two chunks
+        while command != "cancel":
+            results = next(frameResults, None)
+            if results is None:
+                break
+
+            if maskArchive is not None:
+                with timer.measure("maskArchive"):
+                    maskArchive.write(windowStart + checkpoint.completedFrames, results)
+
+            with timer.measure("checkpoint"):
+                checkpoint.append(results)
+
+            # Status updates are throttled, not one per chunk
+            now = time.perf_counter()
+            if now - lastStatus >= STATUS_INTERVAL:
+                lastStatus = now
+                status = getProgressStatus(
+                    windowStart + checkpoint.completedFrames,
+                    windowStop,
+                    windowStart + checkpoint.completedFrames - startFrame,
+                    now - analysisStart,
+                )
+                command = yield status
+    finally:
+        # Also stops the worker processes when the run is cut short
+        frameResults.close()
+
+        if indexedFrames is not None and hasattr(indexedFrames, "close"):
+            indexedFrames.close()
+
+    if command == "cancel":
+        checkpoint.close()
+        if maskArchive is not None:
+            maskArchive.close(windowStart + checkpoint.completedFrames)
+        return f"cancelled after frame {windowStart + checkpoint.completedFrames}, analyze again to resume"
+
+    # Whole analysis of the frames this run, per frame
+    timer.add("analysis", time.perf_counter() - runStart, windowStart + checkpoint.completedFrames - startFrame)
+
+    # The index for these is the frame number
+    if sampling is None:
+        results = checkpoint.load()
+    else:
+        # Frames outside the window have no flame as far as autoCrop is concerned
+        results = ResultStore(max(sampling["totalFrames"], 1))
+        results.appendEmpty(windowStart)
+        checkpoint.load(results)
+        results.appendEmpty(sampling["totalFrames"] - len(results))
+
+        # Every frame read this run was analyzed
+        sampling["framesAnalyzed"] = timer.calls.get("decode", 0)
+    checkpoint.close()
+
+    extraMetadata = {}
+    if sampling is not None:
+        extraMetadata["sampling"] = sampling
+    if maskArchive is not None:
+        # Frames outside an adaptive sampling window have empty masks
+        maskArchive.close(len(results))
+        extraMetadata["maskArchive"] = {"path": "masks.bin", "header": "masks.json", "frames": len(results)}
+
+    status = "post processing data"
+    yield status
+
+    postProcess(results, config, title, dataExportDir, timer, extraMetadata)
+
+
+def runAnalysis(inputPath: str, config: HSVMaskConfigType, progressInterval: float = 10):
+    """
+    Run analyzeInput to the end, printing its status.
+    Frame progress is only printed every progressInterval seconds.
+    """
+    title = getTitle(inputPath)
+    lastProgress = 0
+
+    for status in analyzeInput(inputPath, config, title):
+        isProgress = status.startswith("analyzing frame")
+        if isProgress and time.monotonic() - lastProgress < progressInterval:
+            continue
+        if isProgress:
+            lastProgress = time.monotonic()
+
+        print(f"[{title}] {status}", flush=True)
+
+    print(f"[{title}] done", flush=True)
+    return getDataExportDir(inputPath, title)
@@ -0,0 +1,146 @@
+import json
+import os
+import numpy as np
+from .HSVMaskAnalyzer import ANALYSIS_CONFIG_KEYS, getComponentFilter
+from .frontTracking import getTrackingConfig
+from .resultStore import ResultStore
+
+# One fixed size record per analyzed frame, in frame order
+RECORD_DTYPE = np.dtype(
+    [
+        ("highestXPos", "<i8"),
+        ("lowestXPos", "<i8"),
+        ("boundingBoxWithSecondCropBox", "<i8", (4,)),
+        ("flameTipCoordinates", "<i8", (2,)),
+    ]
+)
+
+CHECKPOINT_VERSION = 1
+
+
+def getInputFingerprint(inputPath: str):
+    """
+    Cheap description of the input that changes when the frames do:
+    size and modification time of the video, or of every file in the
+    image sequence directory.
+    """
+    if os.path.isdir(inputPath):
+        entries = sorted(
+            (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+            for entry in os.scandir(inputPath)
+            if entry.is_file()
+        )
+        return {
+            "files": len(entries),
+            "bytes": sum(entry[1] for entry in entries),
+            "mtime": max((entry[2] for entry in entries), default=0),
+        }
+
+    stat = os.stat(inputPath)
+    return {"files": 1, "bytes": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+class AnalysisCheckpoint:
+    """
+    Per-frame results of a batch analysis, appended to disk as they come in.
+
+    checkpoint.json identifies the input and the analysis config, and
+    frames.bin holds one RECORD_DTYPE record per completed frame. Running
+    the same input with the same config again resumes after the last
+    complete record, anything else starts over.
+    sampling describes which frames the records are for, when it isn't
+    every frame from the first (see adaptiveSampling).
+    """
+
+    def __init__(self, directory: str, inputPath: str, config, sampling: dict = None):
+        self.directory = directory
+        self.infoPath = os.path.join(directory, "checkpoint.json")
+        self.recordsPath = os.path.join(directory, "frames.bin")
+
+        # Round trip through JSON so it compares equal to what was saved
+        self.info = json.loads(
+            json.dumps(
+                {
+                    "version": CHECKPOINT_VERSION,
+                    "input": os.path.abspath(inputPath),
+                    "inputFingerprint": getInputFingerprint(inputPath),
+                    "config": {key: config[key] for key in ANALYSIS_CONFIG_KEYS},
+                    "sampling": sampling,
+                    "componentFilter": getComponentFilter(config),
+                    "tracking": getTrackingConfig(config),
+                    "maskArchive": config.get("maskArchive", False),
+                }
+            )
+        )
+
+        self._file = None
+        self.completedFrames = 0
+
+    def openForAppend(self):
+        """
+        Open for appending. Returns the number of frames already done.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        savedInfo = None
+        if os.path.exists(self.infoPath):
+            with open(self.infoPath) as f:
+                try:
+                    savedInfo = json.load(f)
+                except json.JSONDecodeError:
+                    savedInfo = None
+
+        if savedInfo == self.info and os.path.exists(self.recordsPath):
+            # A record cut short by a crash is dropped
+            self.completedFrames = os.path.getsize(self.recordsPath) // RECORD_DTYPE.itemsize
+            self._file = open(self.recordsPath, "r+b")  # noqa: SIM115 kept open for append, closed in close()
+            self._file.truncate(self.completedFrames * RECORD_DTYPE.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self.completedFrames = 0
+            self._file = open(self.recordsPath, "wb")  # noqa: SIM115 kept open for append, closed in close()
+
+            with open(self.infoPath, "w") as f:
+                json.dump(self.info, f, indent=4)
+
+        return self.completedFrames
+
+    def restart(self):
+        """
+        Drop every completed frame, analysis starts again from the first
+        """
+        self._file.seek(0)
+        self._file.truncate()
+        self.completedFrames = 0
+
+    def append(self, results):
+        """
+        Write the columnar results of a chunk, see HSVMaskAnalyzer.analyzeFrames
+        """
+        records = np.empty(len(results["highestXPos"]), dtype=RECORD_DTYPE)
+        for field in RECORD_DTYPE.names:
+            records[field] = results[field]
+
+        self._file.write(records.tobytes())
+        self._file.flush()
+
+        self.completedFrames += len(records)
+
+    def load(self, results: ResultStore = None):
+        """
+        ResultStore of every completed frame, appended to results when given
+        """
+        if self._file is not None:
+            self._file.flush()
+
+        records = np.fromfile(self.recordsPath, dtype=RECORD_DTYPE, count=self.completedFrames)
+
+        if results is None:
+            results = ResultStore(max(len(records), 1))
+        results.append({field: records[field] for field in RECORD_DTYPE.names})
+        return results
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
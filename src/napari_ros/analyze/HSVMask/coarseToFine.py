@@ -0,0 +1,170 @@
+"""
+Exact extents without thresholding every pixel.
+
+A coarse pass takes the brightest and darkest max(r, g, b) of every tile,
+which is a lot cheaper than the full table lookup. A colour can only be
+flame when its max(r, g, b) is one a flame colour has, so tiles whose range
+has none of those values have no flame in them. The extents only depend on
+the outermost flame pixels, so the remaining tiles are thresholded at full
+resolution from the outside in, one tile row or column at a time, stopping
+at the first one on each side that has flame.
+"""
+from typing import List
+import numpy as np
+from .roiPlanner import normalizeRegion, getSourceSlices
+from .rgbToHsvLookup import rgb_to_flat_index
+from .flameMask import getFlameMaskFromTable
+from .stageTimer import StageTimer, measureStage
+
+DEFAULT_TILE_SIZE = 16
+
+
+def getFlameValues(flameTable: np.ndarray):
+    """
+    (256,) bool, True for every max(r, g, b) at least one flame colour has.
+    flameTable comes from compileFlameTable.
+    """
+    flameValues = np.zeros(256, dtype=bool)
+    maxGreenBlue = np.maximum.outer(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8))
+
+    # One red value at a time, like compileFlameTable
+    bytesPerRed = 256 * 256 // 8
+    for r in range(256):
+        isFlame = np.unpackbits(
+            flameTable[r * bytesPerRed : (r + 1) * bytesPerRed], bitorder="little"
+        ).view(bool)
+        flameValues[np.maximum(maxGreenBlue, r).ravel()[isFlame]] = True
+
+    return flameValues
+
+
+def getCandidateTiles(frames: np.ndarray, flameValues: np.ndarray, tileSize: int):
+    """
+    (N, tile rows, tile columns) bool for frames shaped (N, H, W, 3),
+    False for tiles that can't have any flame in them
+    """
+    value = np.maximum(np.maximum(frames[..., 0], frames[..., 1]), frames[..., 2])
+    rowStarts = np.arange(0, value.shape[1], tileSize)
+    colStarts = np.arange(0, value.shape[2], tileSize)
+
+    tileMax = np.maximum.reduceat(np.maximum.reduceat(value, rowStarts, axis=1), colStarts, axis=2)
+
+    # Values from first to last can be flame, the darkest value is only
+    # needed when some in between can't
+    allowed = np.flatnonzero(flameValues)
+    if len(allowed) == 0:
+        return np.zeros(tileMax.shape, dtype=bool)
+    if allowed[-1] - allowed[0] + 1 == len(allowed) and allowed[-1] == 255:
+        return tileMax >= allowed[0]
+
+    tileMin = np.minimum.reduceat(np.minimum.reduceat(value, rowStarts, axis=1), colStarts, axis=2)
+
+    # Any flame value from tileMin to tileMax
+    counts = np.concatenate([[0], np.cumsum(flameValues)])
+    return counts[tileMax.astype(np.intp) + 1] > counts[tileMin]
+
+
+def lastTrueIndex(array: np.ndarray):
+    return len(array) - 1 - array[::-1].argmax()
+
+
+def findFlameStrip(frame: np.ndarray, flameTable: np.ndarray, candidates: np.ndarray, tileSize: int, reverse: bool):
+    """
+    Threshold the tile rows of frame with candidate tiles one at a time,
+    from the top (or the bottom when reverse), until one has flame.
+    Each tile row is thresholded from its first to its last candidate tile.
+    Returns (first row of the strip, first column of the strip, strip mask),
+    None when no candidate tile has flame.
+    candidates is (tile rows, tile columns), transpose everything for columns.
+    """
+    tileRows = np.flatnonzero(candidates.any(axis=1))
+
+    for tileRow in tileRows[::-1] if reverse else tileRows:
+        tileCols = np.flatnonzero(candidates[tileRow])
+        top, left = tileRow * tileSize, tileCols[0] * tileSize
+        strip = frame[top : top + tileSize, left : (tileCols[-1] + 1) * tileSize]
+
+        mask = getFlameMaskFromTable(flameTable, rgb_to_flat_index(strip))
+        if mask.any():
+            return top, left, mask
+
+    return None
+
+
+def getExtentsFromTiles(frame: np.ndarray, flameTable: np.ndarray, candidates: np.ndarray, tileSize: int):
+    """
+    Same as HSVMaskAnalyzer.getExtentsFromBinaryMask of the mask of frame,
+    where only candidates tiles can have flame
+    """
+    topStrip = findFlameStrip(frame, flameTable, candidates, tileSize, False)
+    if topStrip is None:
+        return {
+            "boundingBox": [0, 0, 0, 0],
+            "highestXPos": 0,
+            "lowestXPos": 0,
+            "flameTip": [0, 0],
+        }
+
+    # The flame tip is in the top strip, the strip covers every candidate tile of its row
+    stripTop, stripLeft, mask = topStrip
+    topRow = mask.any(axis=1).argmax()
+    top = stripTop + topRow
+    flameTipX = stripLeft + lastTrueIndex(mask[topRow])
+
+    stripTop, _, mask = findFlameStrip(frame, flameTable, candidates, tileSize, True)
+    bottom = stripTop + lastTrueIndex(mask.any(axis=1))
+
+    # Every row with flame is between top and bottom, so whole columns can be used
+    columns = frame.transpose(1, 0, 2)
+    stripLeft, _, mask = findFlameStrip(columns, flameTable, candidates.T, tileSize, False)
+    left = stripLeft + mask.any(axis=1).argmax()
+    stripLeft, _, mask = findFlameStrip(columns, flameTable, candidates.T, tileSize, True)
+    right = stripLeft + lastTrueIndex(mask.any(axis=1))
+
+    return {
+        "boundingBox": [top, bottom, left, right],
+        "highestXPos": right,
+        "lowestXPos": left,
+        "flameTip": [flameTipX, top],
+    }
+
+
+def getRegionExtents(
+    stack: np.ndarray,
+    region: List[int],
+    mirror: bool,
+    flameTable: np.ndarray,
+    flameValues: np.ndarray,
+    tileSize: int,
+    timer: StageTimer = None,
+):
+    """
+    Columnar extents of a [top, bottom, left, right] region of every frame,
+    like HSVMaskAnalyzer.getExtentsFromBinaryMasks of its masks
+    """
+    region = normalizeRegion(region, stack.shape[-3:-1])
+    rows, cols = getSourceSlices(region, stack.shape[2], mirror)
+    frames = stack[:, rows, cols]
+    if mirror:
+        frames = frames[:, :, ::-1]
+
+    count = len(stack)
+    extents = {
+        "boundingBox": np.zeros((count, 4), dtype=np.int64),
+        "highestXPos": np.zeros(count, dtype=np.int64),
+        "lowestXPos": np.zeros(count, dtype=np.int64),
+        "flameTip": np.zeros((count, 2), dtype=np.int64),
+    }
+    if frames.shape[1] == 0 or frames.shape[2] == 0:
+        return extents
+
+    with measureStage(timer, "coarse"):
+        candidates = getCandidateTiles(frames, flameValues, tileSize)
+
+    with measureStage(timer, "refine"):
+        for i in np.flatnonzero(candidates.any(axis=(1, 2))):
+            frameExtents = getExtentsFromTiles(frames[i], flameTable, candidates[i], tileSize)
+            for key, values in frameExtents.items():
+                extents[key][i] = values
+
+    return extents
@@ -1,18 +1,16 @@
-import time
 import numpy as np
-from typing import List
-
-from napari.layers import Layer
-from napari.types import LayerDataTuple
 from napari.qt.threading import thread_worker
 
 from .HSVMaskAnalyzer import HSVMaskAnalyzer
 from .analyzeModal import AnalyzeModal
+from .batchAnalysis import getDefaultConfig
 from .parametersWidget import HSVMaskParametersWidget
+from .previewScheduler import PreviewScheduler
+from .previewCache import PreviewCache
+from .previewOverlays import PreviewOverlays
 from .types import HSVMaskConfigType
 
-from qtpy.QtWidgets import QWidget, QVBoxLayout, QPushButton
-from qtpy.QtCore import QTimer
+from qtpy.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel
 
 import json
 import os
@@ -32,12 +30,18 @@ def calculateEstimatedPlateWidthCm(
 
 # TODO: Put in another file
 @thread_worker
-def runHsvMaskAndReturnAnnotations():
-    annotatedLayers: List[LayerDataTuple] = []
+def runHsvMaskAndReturnAnnotations(scheduler: PreviewScheduler):
+    """
+    Runs the newest request from the scheduler and yields
+    (preview, request), see PreviewOverlays.update. Stops when the scheduler is closed.
+    """
+    # Decoded frames and masks are reused across slider changes
+    previewCache = PreviewCache(analyzer)
 
     while True:
-        time.sleep(0.5)
-        new = yield annotatedLayers
+        new = scheduler.waitForRequest()
+        if new is None:
+            return
 
         try:
             layer = new["layer"]
@@ -47,6 +51,8 @@ def runHsvMaskAndReturnAnnotations():
             h = new["h"]
             s = new["s"]
             v = new["v"]
+            minComponentArea = new.get("minComponentArea", 0)
+            keepLargestComponent = new.get("keepLargestComponent", False)
             frameNumber = new["currentFrameNumber"]
         except:
             continue
@@ -55,154 +61,43 @@ def runHsvMaskAndReturnAnnotations():
         if layer is None:
             continue
 
+        # Analyze the full resolution level of multiscale layers
+        layerData = layer.data[0] if layer.multiscale else layer.data
+
         # If mirror, flip the frame in the napari image layer
         if mirror:
-            layer.affine = np.array([[1.0, 0.0, 0.0], [0.0, -1.0, layer.data.shape[2]], [0.0, 0.0, 1.0]])
+            layer.affine = np.array([[1.0, 0.0, 0.0], [0.0, -1.0, layerData.shape[2]], [0.0, 0.0, 1.0]])
         else:
             layer.affine = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
 
-        # Get the current frame
-        rawFrame = layer.data[frameNumber, :, :, :]
-
-        frame, mask, highestXPos, boundingBoxWithSecondCropBox, maskWithSecondCropBox, lowestXPos, flameTipCoordinates = analyzer.completelyAnalyzeFrame(
-            rawFrame, crop, secondCropBox, mirror, h, s, v
-        )
-
-        # Now lets add annotations
-
-        # Mask image layer
-        previewMask = np.zeros((rawFrame.shape[0], rawFrame.shape[1]))
-        start_point = (secondCropBox[0], secondCropBox[2])
-
-        # Calculate the available space in previewMask from the start_point
-        available_height = previewMask.shape[0] - start_point[0]
-        available_width = previewMask.shape[1] - start_point[1]
-
-        # Clip the mask if it exceeds the available space
-        clipped_mask = maskWithSecondCropBox[:min(maskWithSecondCropBox.shape[0], available_height), 
-                                            :min(maskWithSecondCropBox.shape[1], available_width)]
-
-        # Place the clipped mask into the previewMask
-        previewMask[
-            start_point[0]:start_point[0]+clipped_mask.shape[0],
-            start_point[1]:start_point[1]+clipped_mask.shape[1]
-        ] = clipped_mask
-
-        # Preview the mask
-        maskWithSecondCrop = (
-            previewMask,
-            {
-                "name": "Mask WITH SECOND CROP BOX",
-                "colormap": "green",
-                "contrast_limits": [0, 1],
-                "opacity": 0.5,
-            },
-            "image",
-        )
-
-        # Draw a box around the crop
-        boxVerticies = np.array(
-            [
-                [crop[0], crop[2]],
-                [crop[0], crop[3]],
-                [crop[1], crop[3]],
-                [crop[1], crop[2]],
-            ]
-        )
-        cropLayer = (
-            boxVerticies,
-            {"name": "Crop", "edge_color": "white", "face_color": "transparent", "edge_width": 2, "opacity": 1},
-            "shapes",
-        )
+        # Get the current frame, only decoded when the frame changed
+        previewCache.getFrame(layerData, frameNumber)
 
-        # Draw a box around the crop WITH SECOND CROP BOX
-        boxVerticies = np.array(
-            [
-                [secondCropBox[0], secondCropBox[2]],
-                [secondCropBox[0], secondCropBox[3]],
-                [secondCropBox[1], secondCropBox[3]],
-                [secondCropBox[1], secondCropBox[2]],
-            ]
-        )
-        cropLayerWithSecondCropBox = (
-            boxVerticies,
-            {"name": "Crop ONLY X", "edge_color": "grey", "face_color": "transparent", "edge_width": 2, "opacity": 1},
-            "shapes",
-        )
-
-        # Draw a red line at the highest X pos
-        highestXPosLayer = (
-            np.array(
-                [
-                    [crop[0], highestXPos + crop[2]],
-                    [rawFrame.shape[0], highestXPos + crop[2]],
-                ]
-            ),
-            {
-                "name": "Highest X Pos",
-                "edge_color": "red",
-                "shape_type": "line",
-                "edge_width": 5,
-                "opacity": 1,
-            },
-            "Shapes",
-        )
+        # A newer request came in while the frame was read, skip this one
+        if scheduler.isStale(new):
+            continue
 
-        # Draw a magenta line at the lowest X pos
-        lowestXPosLayer = (
-            np.array(
-                [
-                    [crop[0], lowestXPos + crop[2]],
-                    [rawFrame.shape[0], lowestXPos + crop[2]],
-                ]
-            ),
-            {
-                "name": "Lowest X Pos",
-                "edge_color": "magenta",
-                "shape_type": "line",
-                "edge_width": 5,
-                "opacity": 1,
-            },
-            "Shapes",
-        )
+        # Only thresholded again when the frame or h, s, v changed.
+        # Crop, mirror and component filter changes only redo the extents
+        fullMask = previewCache.getMask(layerData, frameNumber, h, s, v)
 
-        # Draw a blue box around the bounding box WITH SECOND CROP BOX offset
-        boundingBoxWithSecondCropBoxLayer = (
-            np.array(
-                [
-                    [boundingBoxWithSecondCropBox[0] + (secondCropBox[0]), boundingBoxWithSecondCropBox[2] + secondCropBox[2]],
-                    [boundingBoxWithSecondCropBox[0] + (secondCropBox[0]), boundingBoxWithSecondCropBox[3] + secondCropBox[2]],
-                    [boundingBoxWithSecondCropBox[1] + (secondCropBox[0]), boundingBoxWithSecondCropBox[3] + secondCropBox[2]],
-                    [boundingBoxWithSecondCropBox[1] + (secondCropBox[0]), boundingBoxWithSecondCropBox[2] + secondCropBox[2]]
-                ]
-            ),
-            {
-                "name": "Bounding Box WITH SECOND CROP BOX",
-                "edge_color": "blue",
-                "face_color": "transparent",
-                "edge_width": 2,
-                "opacity": 1,
-            },
-            "shapes",
+        mask, highestXPos, boundingBoxWithSecondCropBox, maskWithSecondCropBox, lowestXPos, flameTipCoordinates = analyzer.analyzeFullFrameMask(
+            fullMask, crop, secondCropBox, mirror, minComponentArea, keepLargestComponent
         )
 
-        # Draw a purple point at the flame tip
-        flameTipLayer = (
-            np.array(
-                [
-                    [flameTipCoordinates[1] + (secondCropBox[0]), flameTipCoordinates[0] + secondCropBox[2]],
-                ]
-            ),
-            {
-                "name": "Flame Tip",
-                "face_color": "purple",
-                "size": 20,
-                "opacity": 1,
-            },
-            "points",
-        )
+        # Only the results go back, the overlay layers are updated in place
+        preview = {
+            "frameShape": fullMask.shape,
+            "crop": crop,
+            "secondCropBox": secondCropBox,
+            "maskWithSecondCropBox": maskWithSecondCropBox,
+            "highestXPos": highestXPos,
+            "lowestXPos": lowestXPos,
+            "boundingBoxWithSecondCropBox": boundingBoxWithSecondCropBox,
+            "flameTipCoordinates": flameTipCoordinates,
+        }
 
-        annotatedLayers = [maskWithSecondCrop, cropLayerWithSecondCropBox, cropLayer, highestXPosLayer, boundingBoxWithSecondCropBoxLayer, lowestXPosLayer, flameTipLayer]
+        yield preview, new
 
 
 def calculateEstimatedPlateWidthCm(
@@ -240,31 +135,33 @@ class HSVMaskConfigWidget(QWidget):
         # Will be changed by dims.events.current_step
         self.currentFrameNumber = -1
 
-        # Layer 0 should be the image sequence
+        # Layer 0 should be the image sequence (or video)
 
         self.imageSequenceDirectory = self._viewer.layers[0].source.path
-        self.configFilePath = os.path.join(self.imageSequenceDirectory, os.pardir, "napari_ros_last_config.json")
+        self.configFilePath = os.path.join(
+            os.path.dirname(os.path.abspath(self.imageSequenceDirectory)),
+            "napari_ros_last_config.json",
+        )
 
         self.preloadedConfig = fetchConfigFromUserSettings(self.configFilePath)
 
         self.config: HSVMaskConfigType = {
             "layer": self._viewer.layers[0],
-            "crop": [960, 987, 511, 1496],
-            "secondCropBox": [360, 987, 511, 1496],
-            "mirror": True,
-            "h": [0.0, 0.32407407407407407],
-            "s": [0.0, 0.6620370370370371],
-            "v": [0.9, 1.0],
-            "pixelsInUnit": 104,
-            "cmApart": 4.5,
-            "fps": 59.94
+            **getDefaultConfig(),
         }
 
         # If preloaded config, merge it with the default config
         if self.preloadedConfig is not None:
             self.config = {**self.config, **self.preloadedConfig}
 
-        self.worker = runHsvMaskAndReturnAnnotations()
+        # Only the newest preview request runs, see PreviewScheduler
+        self.scheduler = PreviewScheduler()
+        self.destroyed.connect(self.scheduler.close)
+
+        # Overlay layers, created on the first preview
+        self.overlays = PreviewOverlays(self._viewer)
+
+        self.worker = runHsvMaskAndReturnAnnotations(self.scheduler)
         self.worker.yielded.connect(self.on_yielded)
         self.worker.start()
 
@@ -288,9 +185,13 @@ class HSVMaskConfigWidget(QWidget):
         analyzeButton.clicked.connect(self.runAnalysis)
         layout.addWidget(analyzeButton)
 
-        # Send config to worker to create initial annotations
-        # Add a delay so the worker has time to start
-        QTimer.singleShot(2000, self.workerFrameAnalysis)
+        # Time from the last change to the overlays being updated
+        self.latencyLabel = QLabel()
+        layout.addWidget(self.latencyLabel)
+
+        # Send config to worker to create initial annotations.
+        # The scheduler holds on to it until the worker is running
+        self.workerFrameAnalysis()
 
         self.setLayout(layout)
 
@@ -310,30 +211,12 @@ class HSVMaskConfigWidget(QWidget):
         # Add current frame number to config dict, so we can send it to the worker
         configToSend = self.config.copy()
         configToSend["currentFrameNumber"] = self.currentFrameNumber
-        self.worker.send(configToSend)
-        self.worker.resume()
+        self.scheduler.submit(configToSend)
 
     def on_yielded(self, value):
-        self.worker.pause()
-
-        if len(value) == 0:
-            return
-
-        currentLayers = self._viewer.layers
-
-        # TODO: Make layer updating more efficient
-        # and don't use _add_layer_from_data
-        for returnedLayerTuple in value:
-            returnedLayerName = returnedLayerTuple[1]["name"]
-            foundLayer = False
-
-            for layer in currentLayers:
-                if layer.name == returnedLayerName:
-                    foundLayer = True
-                    layer.data = returnedLayerTuple[0]
-                    break
+        preview, request = value
 
-            if foundLayer:
-                continue
+        self.overlays.update(preview)
 
-            self._viewer.add_layer(Layer.create(*returnedLayerTuple))
\ No newline at end of file
+        latencyMs = self.scheduler.getLatencyMs(request)
+        self.latencyLabel.setText(f"Preview latency: {latencyMs:.0f} ms")
@@ -0,0 +1,69 @@
+import os
+import pandas as pd
+
+# Formats for exportFormats in the config, besides the CSV that is always written
+COLUMNAR_FORMATS = {
+    "parquet": "highestXPos.parquet",
+    "feather": "highestXPos.feather",
+}
+
+# Schema metadata key holding the contents of metadata.json
+SCHEMA_METADATA_KEY = b"napari_ros"
+
+
+def checkExportFormats(formats: list):
+    """
+    Raise when formats has an unknown format, or when it needs pyarrow and
+    pyarrow isn't installed. Lets a run fail before any frame is analyzed.
+    """
+    unknownFormats = set(formats) - set(COLUMNAR_FORMATS)
+    if unknownFormats:
+        raise ValueError(
+            f"unknown export formats {sorted(unknownFormats)}, expected some of {sorted(COLUMNAR_FORMATS)}"
+        )
+
+    if not formats:
+        return
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "Parquet and Feather export need pyarrow, install it with pip install napari-ros[arrow]"
+        ) from e
+
+
+def exportColumnar(df: pd.DataFrame, metadataJson: str, exportDir: str, formats: list):
+    """
+    Write df as typed, zstd compressed Parquet and/or Feather (Arrow IPC)
+    files, with metadata.json embedded in the schema metadata.
+    Needs pyarrow, which is optional (pip install napari-ros[arrow]).
+    Returns the paths written.
+    """
+    checkExportFormats(formats)
+    if not formats:
+        return []
+
+    import pyarrow as pa
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Keep the pandas metadata that from_pandas added
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), SCHEMA_METADATA_KEY: metadataJson.encode()}
+    )
+
+    paths = []
+    for exportFormat in formats:
+        path = os.path.join(exportDir, COLUMNAR_FORMATS[exportFormat])
+
+        if exportFormat == "parquet":
+            pyarrow.parquet.write_table(table, path, compression="zstd")
+        else:
+            pyarrow.feather.write_feather(table, path, compression="zstd")
+
+        paths.append(path)
+
+    return paths
@@ -37,6 +37,74 @@ def getFlameMask(
     )
 
 
+def compileFlameTable(
+    h: tuple[float, float],
+    s: tuple[float, float],
+    v: tuple[float, float],
+    hsvLookup: np.ndarray,
+):
+    """
+    Run getFlameMask over every 24-bit RGB colour at once and bit-pack the
+    result into a 2 MB table. Bit i (little endian within each byte) is set
+    when the colour with flat index i, (r << 16) | (g << 8) | b, is flame.
+    hsvLookup is the (256, 256, 256, 3) table from load_rgb_to_hsv_lookup.
+    """
+    flameTable = np.empty(256 * 256 * 256 // 8, dtype=np.uint8)
+
+    # One red value at a time keeps the temporary arrays small
+    bytesPerRed = 256 * 256 // 8
+    for r in range(256):
+        flameTable[r * bytesPerRed : (r + 1) * bytesPerRed] = np.packbits(
+            getFlameMask(h, s, v, hsvLookup[r]), axis=None, bitorder="little"
+        )
+
+    return flameTable
+
+
+def getFlameMaskFromTable(flameTable: np.ndarray, rgbIndex: np.ndarray):
+    """
+    Same output as getFlameMask, but looks every pixel up in a table from
+    compileFlameTable. rgbIndex comes from rgb_to_flat_index.
+    """
+    bits = flameTable[rgbIndex >> 3] >> (rgbIndex & 7).astype(np.uint8)
+    bits &= 1
+    return bits.view(bool)
+
+
+def filterFlameComponents(masks: np.ndarray, minComponentArea: int = 0, keepLargestComponent: bool = False):
+    """
+    Remove the connected components (8-connected) of a mask, or of every
+    mask in a stack shaped (N, H, W), with fewer than minComponentArea
+    pixels. With keepLargestComponent, only the largest one is kept.
+    Embers and reflections away from the flame would otherwise push the
+    extents outward. Returns new masks, the input is left as it is.
+    """
+    filtered = np.zeros(masks.shape, dtype=bool)
+
+    for mask, filteredMask in zip(masks.reshape(-1, *masks.shape[-2:]), filtered.reshape(-1, *masks.shape[-2:])):
+        rowsWithFlame = np.flatnonzero(mask.any(axis=1))
+        if len(rowsWithFlame) == 0:
+            continue
+
+        # Only label the bounding box of the flame
+        colsWithFlame = np.flatnonzero(mask[rowsWithFlame[0] : rowsWithFlame[-1] + 1].any(axis=0))
+        box = (
+            slice(rowsWithFlame[0], rowsWithFlame[-1] + 1),
+            slice(colsWithFlame[0], colsWithFlame[-1] + 1),
+        )
+        labels = measure.label(mask[box], connectivity=2)
+
+        areas = np.bincount(labels.ravel())
+        areas[0] = 0
+        keep = areas >= max(minComponentArea, 1)
+        if keepLargestComponent:
+            keep &= np.arange(len(areas)) == areas.argmax()
+
+        filteredMask[box] = keep[labels]
+
+    return filtered
+
+
 def getBinaryContours(frame: np.ndarray, constant=0.8):
     """
     Get the contours of a binary image.
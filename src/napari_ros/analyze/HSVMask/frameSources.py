@@ -0,0 +1,61 @@
+import os
+from pims import ImageSequence
+import av
+from ..._video import isVideoFile, iterVideoFrames, iterVideoFramesFrom, VideoReader
+
+
+def openFrames(inputPath: str, startFrame: int = 0):
+    """
+    Iterate over the frames of an image sequence directory or a video file,
+    starting at frame startFrame.
+    Videos are stream-decoded, so memory use doesn't grow with their length.
+    """
+    if isVideoFile(inputPath):
+        if startFrame > 0:
+            return iterVideoFramesFrom(inputPath, startFrame)
+        return iterVideoFrames(inputPath)
+
+    return ImageSequence(inputPath)[startFrame:]
+
+
+def openIndexedFrames(inputPath: str):
+    """
+    Random access to the frames of an image sequence directory or a video,
+    for analyses that don't go through every frame in order
+    """
+    if isVideoFile(inputPath):
+        return VideoReader(inputPath, prefetchFrames=0)
+
+    return ImageSequence(inputPath)
+
+
+def countFrames(inputPath: str):
+    """
+    Number of frames, from the video's header or the files in the directory.
+    None when the video doesn't say.
+    """
+    if isVideoFile(inputPath):
+        with av.open(inputPath) as container:
+            return container.streams.video[0].frames or None
+
+    return len(ImageSequence(inputPath))
+
+
+def getTitle(inputPath: str):
+    """
+    Name of the directory, or of the video without its extension
+    """
+    title = os.path.basename(os.path.normpath(inputPath))
+
+    if isVideoFile(inputPath):
+        title = os.path.splitext(title)[0]
+
+    return title
+
+
+def getDataExportDir(inputPath: str, title: str):
+    """
+    data/<title>, next to the image sequence directory or video
+    """
+    parentDir = os.path.dirname(os.path.abspath(inputPath))
+    return os.path.join(parentDir, "data", title)
@@ -0,0 +1,213 @@
+import numpy as np
+from .HSVMaskAnalyzer import HSVMaskAnalyzer, RESULT_KEYS, concatenateResults, getFramesPerBlock
+from .roiPlanner import normalizeRegion
+from .stageTimer import StageTimer, measureStage
+
+# The config keys FrontTracker results depend on, with their defaults
+TRACKING_CONFIG_DEFAULTS = {
+    "frontTracking": False,
+    "trackingMargin": 32,
+    "trackingRefreshFrames": 60,
+}
+
+
+def getTrackingConfig(config):
+    """
+    The front tracking settings of config, None when tracking is off.
+    The mask archive needs the whole masks, so it turns tracking off.
+    """
+    if not config.get("frontTracking", False) or config.get("maskArchive", False):
+        return None
+
+    return {key: config.get(key, default) for key, default in TRACKING_CONFIG_DEFAULTS.items()}
+
+
+class FrontTracker:
+    """
+    analyzeFrames for consecutive chunks of frames that only thresholds a
+    band of columns around where the flame was in the previous frame.
+
+    The band runs from the lowest to the highest x of the previous frame's
+    masks, over the full height of both crop boxes. It is widened by as far
+    as the sides of the flame moved between the last two frames, once per
+    frame in the chunk, and by trackingMargin pixels on both sides. A frame is analyzed again at full width
+    when its flame touches a side of the band (it may go on outside of it),
+    when either mask is empty in the band, and every trackingRefreshFrames
+    frames (never when it is 0), which also catches flame appearing away
+    from the band. Flame that appears outside the band without touching it
+    is only picked up at the next full width frame, so the results are
+    approximate.
+    The band covers the whole width of the flame, not just its edges, so
+    the saving shrinks as the burning area widens. coarseToFine only
+    thresholds around the edges and is exact.
+    """
+
+    def __init__(self, analyzer: HSVMaskAnalyzer, config):
+        self.analyzer = analyzer
+        self.config = config
+        self.margin = config.get("trackingMargin", TRACKING_CONFIG_DEFAULTS["trackingMargin"])
+        self.refreshFrames = config.get(
+            "trackingRefreshFrames", TRACKING_CONFIG_DEFAULTS["trackingRefreshFrames"]
+        )
+
+        # [left, right) of the flame in mirrored frame columns in the last
+        # frame, None when there is nothing to track
+        self.band = None
+        self.velocity = (0, 0)
+        self.frameCount = 0
+
+        # Frames that were analyzed at full width after all
+        self.fullWidthFrames = 0
+
+    def getRegions(self, frameShape):
+        """
+        Normalized secondCropBox and crop, in the order analyzeFrames masks them
+        """
+        return [
+            normalizeRegion(self.config[key], frameShape) for key in ["secondCropBox", "crop"]
+        ]
+
+    def getFlameColumns(self, results, index: int, frameShape):
+        """
+        [left, right) of the flame in frame index of results, in mirrored
+        frame columns. None when either mask is empty.
+        """
+        secondCropBox, crop = self.getRegions(frameShape)
+        boundingBox = results["boundingBoxWithSecondCropBox"][index]
+        highestXPos = results["highestXPos"][index]
+
+        # An empty mask has all its extents at 0
+        if not boundingBox.any() or not highestXPos:
+            return None
+
+        left = min(secondCropBox[2] + boundingBox[2], crop[2] + results["lowestXPos"][index])
+        right = max(secondCropBox[2] + boundingBox[3], crop[2] + highestXPos) + 1
+        return int(left), int(right)
+
+    def updateBand(self, results, frameShape):
+        """
+        Flame columns and how fast its sides move, from the last frames of results
+        """
+        # The frame before the last one is the last one of the previous call
+        # when there was only one frame this time
+        if len(results["highestXPos"]) > 1:
+            previous = self.getFlameColumns(results, -2, frameShape)
+        else:
+            previous = self.band
+
+        self.band = self.getFlameColumns(results, -1, frameShape)
+        if self.band is None or previous is None:
+            self.velocity = (0, 0)
+        else:
+            self.velocity = (self.band[0] - previous[0], self.band[1] - previous[1])
+
+    def getChunkBand(self, frameCount: int):
+        """
+        Columns the flame can reach in the next frameCount frames:
+        the sides keep moving the way they did, plus the margin
+        """
+        left = self.band[0] + min(self.velocity[0], 0) * frameCount - self.margin
+        right = self.band[1] + max(self.velocity[1], 0) * frameCount + self.margin
+        return left, right
+
+    def analyzeInBand(self, stack: np.ndarray, timer: StageTimer = None):
+        """
+        analyzeFrames results with every mask cut down to the band.
+        Also returns which frames have to be analyzed at full width.
+        """
+        regions = self.getRegions(stack.shape[-3:-1])
+        bandLeft, bandRight = self.getChunkBand(len(stack))
+        bandRegions = [
+            (top, bottom, max(left, bandLeft), min(right, bandRight))
+            for top, bottom, left, right in regions
+        ]
+
+        _, masks = self.analyzer.getRegionMasks(
+            stack, bandRegions, self.config["mirror"], self.config["h"], self.config["s"], self.config["v"], timer
+        )
+
+        needsFullWidth = np.zeros(len(stack), dtype=bool)
+
+        # Flame on a side of the band that isn't a side of the crop box.
+        # Checked before the component filter, which only sees the part in the band
+        for region, bandRegion, mask in zip(regions, bandRegions, masks):
+            if mask.shape[2] == 0:
+                continue
+            if bandRegion[2] > region[2]:
+                needsFullWidth |= mask[:, :, 0].any(axis=1)
+            if bandRegion[3] < region[3]:
+                needsFullWidth |= mask[:, :, -1].any(axis=1)
+
+        masks = [self.analyzer.filterMasks(mask, self.config, timer) for mask in masks]
+        extents = []
+
+        with measureStage(timer, "extents"):
+            for region, bandRegion, mask in zip(regions, bandRegions, masks):
+                regionExtents = self.analyzer.getExtentsFromBinaryMasks(mask)
+                hasFlame = mask.any(axis=(1, 2))
+                needsFullWidth |= ~hasFlame
+
+                # Back to crop box columns
+                offset = bandRegion[2] - region[2]
+                regionExtents["boundingBox"][hasFlame, 2:] += offset
+                regionExtents["highestXPos"][hasFlame] += offset
+                regionExtents["lowestXPos"][hasFlame] += offset
+                regionExtents["flameTip"][hasFlame, 0] += offset
+                extents.append(regionExtents)
+
+        extentsWithSecondCropBox, extents = extents
+        results = {
+            "highestXPos": extents["highestXPos"],
+            "lowestXPos": extents["lowestXPos"],
+            "boundingBoxWithSecondCropBox": extentsWithSecondCropBox["boundingBox"],
+            "flameTipCoordinates": extentsWithSecondCropBox["flameTip"],
+        }
+        return results, needsFullWidth
+
+    def analyzeFrames(self, stack: np.ndarray, timer: StageTimer = None):
+        """
+        Same columnar results as HSVMaskAnalyzer.analyzeFrames, for the
+        chunk of frames right after the last one analyzed
+        """
+        stack = np.asarray(stack)
+        frameShape = stack.shape[-3:-1]
+
+        # Cache-sized blocks, like HSVMaskAnalyzer.analyzeFrames
+        framesPerBlock = getFramesPerBlock(frameShape)
+        if len(stack) > framesPerBlock:
+            return concatenateResults(
+                self.analyzeFrames(stack[start : start + framesPerBlock], timer)
+                for start in range(0, len(stack), framesPerBlock)
+            )
+
+        if self.band is None:
+            # Nothing to track, the first frame tells if there is now
+            head = self.analyzer.analyzeFrames(stack[:1], self.config, timer=timer)
+            self.updateBand(head, frameShape)
+            self.frameCount += 1
+            self.fullWidthFrames += 1
+
+            if len(stack) == 1:
+                return head
+            if self.band is None:
+                rest = self.analyzer.analyzeFrames(stack[1:], self.config, timer=timer)
+                self.updateBand(rest, frameShape)
+                self.frameCount += len(stack) - 1
+                self.fullWidthFrames += len(stack) - 1
+                return concatenateResults([head, rest])
+
+            return concatenateResults([head, self.analyzeFrames(stack[1:], timer)])
+
+        results, needsFullWidth = self.analyzeInBand(stack, timer)
+        if self.refreshFrames > 0:
+            needsFullWidth |= (self.frameCount + np.arange(len(stack))) % self.refreshFrames == 0
+
+        if needsFullWidth.any():
+            fullWidth = self.analyzer.analyzeFrames(stack[needsFullWidth], self.config, timer=timer)
+            for key in RESULT_KEYS:
+                results[key][needsFullWidth] = fullWidth[key]
+
+        self.fullWidthFrames += int(needsFullWidth.sum())
+        self.updateBand(results, frameShape)
+        self.frameCount += len(stack)
+        return results
@@ -0,0 +1,185 @@
+import json
+import os
+import numpy as np
+
+MASK_ARCHIVE_VERSION = 1
+
+# Masks in every record, in order, like the mask returned by analyzeFrames
+MASK_NAMES = ["maskWithSecondCropBox", "mask"]
+
+
+def packMasks(masksWithSecondCropBox: np.ndarray, masks: np.ndarray):
+    """
+    Bit-pack both crop box masks of a block, one row of bytes per frame.
+    Returns (packedMasks (N, record bytes), maskShapes (N, 2, 2)), columnar
+    like the rest of the analyzeFrames results.
+    """
+    count = len(masks)
+    packed = [
+        np.packbits(blockMasks.reshape(count, -1), axis=1, bitorder="little")
+        for blockMasks in [masksWithSecondCropBox, masks]
+    ]
+    maskShapes = np.empty((count, 2, 2), dtype=np.int64)
+    maskShapes[:] = [masksWithSecondCropBox.shape[1:], masks.shape[1:]]
+
+    return np.concatenate(packed, axis=1), maskShapes
+
+
+def getMaskLayout(maskShapes):
+    """
+    Where each mask is in a record, for the header
+    """
+    layout = []
+    offset = 0
+    for name, shape in zip(MASK_NAMES, maskShapes):
+        byteCount = -(-int(np.prod(shape)) // 8)
+        layout.append({"name": name, "shape": [int(size) for size in shape], "offset": offset, "bytes": byteCount})
+        offset += byteCount
+
+    return layout
+
+
+class MaskArchiveWriter:
+    """
+    Writes the bit-packed masks of a batch analysis to masks.bin, one
+    fixed size record per frame at frame * record bytes, so frames can be
+    written (and rewritten when resuming) in any order. Frames that were
+    never written read back as empty masks. masks.json describes the records.
+    With resume, the records of an earlier run are kept; check canResume first.
+    """
+
+    def __init__(self, directory: str, resume: bool = False):
+        self.dataPath = os.path.join(directory, "masks.bin")
+        self.headerPath = os.path.join(directory, "masks.json")
+        self.resume = resume
+
+        self.header = None
+        self.frames = 0
+        self._file = None
+
+    def loadSavedHeader(self):
+        """
+        masks.json of an earlier run, None when it or masks.bin is missing or unreadable
+        """
+        if not os.path.exists(self.headerPath) or not os.path.exists(self.dataPath):
+            return None
+
+        with open(self.headerPath) as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return None
+
+    def canResume(self, frames: int):
+        """
+        True when masks.bin has the records of the first frames frames,
+        so a run that got that far can carry on without leaving a gap
+        """
+        savedHeader = self.loadSavedHeader()
+        if savedHeader is None or savedHeader.get("version") != MASK_ARCHIVE_VERSION:
+            return False
+
+        return os.path.getsize(self.dataPath) >= frames * savedHeader["recordBytes"]
+
+    def openRecords(self, maskShapes):
+        layout = getMaskLayout(maskShapes)
+        self.header = {
+            "version": MASK_ARCHIVE_VERSION,
+            "bitorder": "little",
+            "masks": layout,
+            "recordBytes": sum(mask["bytes"] for mask in layout),
+            "frames": 0,
+        }
+
+        if self.resume:
+            # Starting over would leave the frames of the run being resumed empty
+            savedHeader = self.loadSavedHeader()
+            if savedHeader is None or {**savedHeader, "frames": 0} != self.header:
+                raise ValueError(f"can't resume {self.dataPath}, its records are missing or don't match")
+
+            self.frames = os.path.getsize(self.dataPath) // self.header["recordBytes"]
+            self._file = open(self.dataPath, "r+b")  # noqa: SIM115 written to during the run, closed in close()
+        else:
+            self.frames = 0
+            self._file = open(self.dataPath, "wb")  # noqa: SIM115 written to during the run, closed in close()
+
+        self.writeHeader()
+
+    def writeHeader(self):
+        with open(self.headerPath, "w") as f:
+            json.dump({**self.header, "frames": self.frames}, f, indent=4)
+
+    def write(self, startFrame: int, results):
+        """
+        Write the packedMasks of analyzeFrames results for frames startFrame onward
+        """
+        packedMasks = results["packedMasks"]
+        if len(packedMasks) == 0:
+            return
+
+        if self._file is None:
+            self.openRecords(results["maskShapes"][0])
+
+        self._file.seek(startFrame * self.header["recordBytes"])
+        self._file.write(np.ascontiguousarray(packedMasks).tobytes())
+        self._file.flush()
+
+        self.frames = max(self.frames, startFrame + len(packedMasks))
+
+    def close(self, frames: int = None):
+        """
+        frames sets the number of frames in the archive, e.g. the whole
+        input when only part of it was analyzed
+        """
+        if self._file is None:
+            return
+
+        if frames is not None:
+            self.frames = frames
+
+        # Records past the last frame are from a longer earlier run
+        self._file.truncate(self.frames * self.header["recordBytes"])
+        self._file.close()
+        self._file = None
+        self.writeHeader()
+
+
+class MaskArchive:
+    """
+    Random access to the masks in masks.bin, memory-mapped:
+
+        archive = MaskArchive("data/burn")
+        masks = archive[120]
+        masks["mask"], masks["maskWithSecondCropBox"]
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "masks.json")) as f:
+            self.header = json.load(f)
+
+        frames = self.header["frames"]
+        recordBytes = self.header["recordBytes"]
+        if frames == 0:
+            self.records = np.zeros((0, recordBytes), dtype=np.uint8)
+        else:
+            self.records = np.memmap(
+                os.path.join(directory, "masks.bin"), dtype=np.uint8, mode="r", shape=(frames, recordBytes)
+            )
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, frame: int):
+        """
+        Masks of frame (counting from 0) by name, see MASK_NAMES
+        """
+        record = self.records[frame]
+
+        masks = {}
+        for mask in self.header["masks"]:
+            shape = mask["shape"]
+            packed = record[mask["offset"] : mask["offset"] + mask["bytes"]]
+            bits = np.unpackbits(packed, count=int(np.prod(shape)), bitorder=self.header["bitorder"])
+            masks[mask["name"]] = bits.view(bool).reshape(shape)
+
+        return masks
@@ -0,0 +1,187 @@
+import multiprocessing
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Iterable
+import numpy as np
+from .HSVMaskAnalyzer import HSVMaskAnalyzer, ANALYSIS_CONFIG_KEYS, COMPONENT_FILTER_DEFAULTS
+from .frontTracking import FrontTracker, TRACKING_CONFIG_DEFAULTS, getTrackingConfig
+from .coarseToFine import DEFAULT_TILE_SIZE
+from .rgbToHsvLookup import load_rgb_to_hsv_lookup
+from .stageTimer import StageTimer
+
+# Each worker process gets its own analyzer, see initWorker
+workerAnalyzer = None
+
+
+def initWorker():
+    global workerAnalyzer
+    workerAnalyzer = HSVMaskAnalyzer()
+
+
+def analyzeSharedFrames(frames: np.ndarray, config):
+    # Stage times go back with the results, the main process adds them up
+    timer = StageTimer()
+    if getTrackingConfig(config) is not None:
+        # Chunks go to any worker, so tracking starts over in every chunk
+        results = FrontTracker(workerAnalyzer, config).analyzeFrames(frames, timer)
+    else:
+        results = workerAnalyzer.analyzeFrames(frames, config, timer=timer)
+    results["timings"] = timer.getSummary()
+    return results
+
+
+def analyzeSharedChunk(blockName: str, shape: tuple, dtype: str, config):
+    """
+    Runs in a worker process. Attaches to the shared memory block
+    holding a chunk of frames and analyzes every frame in it.
+    """
+    # The main process owns the block and unlinks it when the run is done
+    block = shared_memory.SharedMemory(name=blockName)
+
+    try:
+        # Every view of the block has to be gone before it can be closed,
+        # so the frames only live inside analyzeSharedFrames
+        return analyzeSharedFrames(
+            np.ndarray(shape, dtype=dtype, buffer=block.buf), config
+        )
+    finally:
+        block.close()
+
+
+def iterFrameChunks(frames: Iterable[np.ndarray], chunkSize: int, timer: StageTimer = None):
+    """
+    Group frames into lists of up to chunkSize frames.
+    A chunk also ends when the frame shape or dtype changes.
+    Reading every frame is timed as the decode stage.
+    """
+    chunk = []
+    frames = iter(frames)
+
+    while True:
+        start = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        frame = np.asarray(frame)
+
+        if timer is not None:
+            timer.add("decode", time.perf_counter() - start)
+
+        if chunk and (frame.shape != chunk[0].shape or frame.dtype != chunk[0].dtype):
+            yield chunk
+            chunk = []
+
+        chunk.append(frame)
+
+        if len(chunk) == chunkSize:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def analyzeFramesInChunks(
+    analyzer: HSVMaskAnalyzer,
+    frames: Iterable[np.ndarray],
+    config,
+    chunkSize: int = 16,
+    timer: StageTimer = None,
+):
+    """
+    Analyze frames in this process, chunkSize frames at a time.
+    Yields the columnar results of HSVMaskAnalyzer.analyzeFrames
+    for every chunk, in frame order.
+    With frontTracking set, the chunks go through one FrontTracker.
+    """
+    tracker = FrontTracker(analyzer, config) if getTrackingConfig(config) is not None else None
+
+    for chunk in iterFrameChunks(frames, chunkSize, timer):
+        if tracker is not None:
+            yield tracker.analyzeFrames(np.stack(chunk), timer)
+        else:
+            yield analyzer.analyzeFrames(np.stack(chunk), config, timer=timer)
+
+
+def analyzeFramesInParallel(
+    frames: Iterable[np.ndarray],
+    config,
+    workers: int,
+    chunkSize: int = 16,
+    timer: StageTimer = None,
+):
+    """
+    Analyze frames across a pool of worker processes.
+    Frames are read here and copied into shared memory in chunks of
+    chunkSize frames, so only the block name gets pickled to the workers.
+    Yields the columnar results of HSVMaskAnalyzer.analyzeFrames
+    for every chunk, in frame order.
+    The workers' stage times are added to timer, summed over the workers.
+    """
+    # Only what the workers need, the config can also hold the napari layer
+    analysisConfig = {key: config[key] for key in ANALYSIS_CONFIG_KEYS}
+    for defaults in [COMPONENT_FILTER_DEFAULTS, TRACKING_CONFIG_DEFAULTS]:
+        analysisConfig.update({key: config.get(key, default) for key, default in defaults.items()})
+    analysisConfig["coarseToFine"] = config.get("coarseToFine", False)
+    analysisConfig["coarseTileSize"] = config.get("coarseTileSize", DEFAULT_TILE_SIZE)
+    analysisConfig["maskArchive"] = config.get("maskArchive", False)
+
+    # Make sure the lookup table exists before the workers all try to build it
+    load_rgb_to_hsv_lookup()
+
+    # Keep every worker busy with one chunk queued up behind it
+    maxPending = workers * 2
+
+    blocks = []
+    freeBlocks = []
+    pending = deque()
+
+    def collectOldest():
+        asyncResult, block = pending.popleft()
+        results = asyncResult.get()
+        freeBlocks.append(block)
+
+        timings = results.pop("timings")
+        if timer is not None:
+            timer.merge(timings)
+        return results
+
+    try:
+        with multiprocessing.get_context("spawn").Pool(
+            workers, initializer=initWorker
+        ) as pool:
+            for chunk in iterFrameChunks(frames, chunkSize, timer):
+                shape = (len(chunk), *chunk[0].shape)
+                dtype = chunk[0].dtype
+                nbytes = int(np.prod(shape)) * dtype.itemsize
+
+                # Reuse a block that is free and big enough
+                block = next((b for b in freeBlocks if b.size >= nbytes), None)
+                if block is None:
+                    block = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+                    blocks.append(block)
+                else:
+                    freeBlocks.remove(block)
+
+                np.stack(chunk, out=np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+                pending.append(
+                    (
+                        pool.apply_async(
+                            analyzeSharedChunk,
+                            (block.name, shape, dtype.str, analysisConfig),
+                        ),
+                        block,
+                    )
+                )
+
+                while len(pending) >= maxPending:
+                    yield collectOldest()
+
+            while pending:
+                yield collectOldest()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
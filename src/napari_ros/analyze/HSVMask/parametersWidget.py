@@ -12,6 +12,7 @@ from qtpy.QtWidgets import (
 )
 from superqt import QLabeledDoubleRangeSlider
 import numpy as np
+import os
 from .types import HSVMaskConfigType
 from typing import List
 from sympy import S
@@ -135,6 +136,26 @@ class HSVMaskParametersWidget(QWidget):
             )
             layout.addWidget(slider)
 
+        # Component filter, for embers and reflections away from the flame
+        minComponentAreaLabel = QLabel("Ignore flame specks smaller than (px)")
+        layout.addWidget(minComponentAreaLabel)
+
+        minComponentAreaSpinBox = QSpinBox()
+        minComponentAreaSpinBox.setRange(0, 100000)
+        minComponentAreaSpinBox.setValue(self.config["minComponentArea"])
+        minComponentAreaSpinBox.valueChanged.connect(
+            lambda x: self.updateConversionState("minComponentArea", x)
+        )
+        layout.addWidget(minComponentAreaSpinBox)
+
+        keepLargestComponentButton = QPushButton("Only keep the largest flame")
+        keepLargestComponentButton.setCheckable(True)
+        keepLargestComponentButton.setChecked(self.config["keepLargestComponent"])
+        keepLargestComponentButton.clicked.connect(
+            lambda: self.updateConversionState("keepLargestComponent", keepLargestComponentButton.isChecked())
+        )
+        layout.addWidget(keepLargestComponentButton)
+
         # Width between markers
         widthBetweenMarkersLabel = QLabel("Width between markers in video (px)")
         layout.addWidget(widthBetweenMarkersLabel)
@@ -158,6 +179,18 @@ class HSVMaskParametersWidget(QWidget):
         )
         layout.addWidget(self.cmApartSpinBox)
 
+        # Spin box to set the number of analysis processes
+        workersLabel = QLabel("Analysis processes")
+        layout.addWidget(workersLabel)
+
+        workersSpinBox = QSpinBox()
+        workersSpinBox.setRange(1, os.cpu_count() or 1)
+        workersSpinBox.setValue(self.config["workers"])
+        workersSpinBox.valueChanged.connect(
+            lambda x: self.updateConversionState("workers", x)
+        )
+        layout.addWidget(workersSpinBox)
+
         self.estimatedPlateLength = -1
         self.plateLengthLabel = QLabel()
         self.plateLengthLabel.setWordWrap(True)
@@ -1,12 +1,14 @@
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use("Agg", force=True)
-import matplotlib.pyplot as plt
-import multiprocessing
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import json
 from napari_ros import _version
 import os
+from .resultStore import ResultStore
+from .export import exportColumnar
+from .stageTimer import StageTimer
+from .HSVMaskAnalyzer import getComponentFilter
 
 # Allow for JSON encoding of non-JSON serializable objects like numpy
 class JSONEncoderCustom(json.JSONEncoder):
@@ -16,20 +18,8 @@ class JSONEncoderCustom(json.JSONEncoder):
         except TypeError:
             return str(obj)
 
-def highestXPosListToPd(highestXPosList: list):
-    df = pd.DataFrame(columns=['frame', 'highestXPos'])
-
-    # Fill frame column with numbers 1 to len(highestXPosList)
-    df['frame'] = range(1, len(highestXPosList) + 1)
-
-    # Fill highestXPos column with highestXPosList
-    df['highestXPos'] = highestXPosList
-
-    return df
-
-def autoCrop(highestXPosList: list) -> list:
-    # Using numpy temporarily for array operations
-    data = np.array(highestXPosList)
+def autoCrop(highestXPos: np.ndarray):
+    data = np.asarray(highestXPos)
 
     # Get the max index
     maxIndex = data.argmax()
@@ -40,7 +30,7 @@ def autoCrop(highestXPosList: list) -> list:
     # TODO: Make sure to check weird edge cases
     dataTrim = data[firstIndex:maxIndex]
     
-    return dataTrim.tolist(), firstIndex, maxIndex
+    return dataTrim, firstIndex, maxIndex
 
 def convertPxToCm(df: pd.DataFrame, column: str, pixelsInUnit, cmApart):
     df[column + "Cm"] = df[column] / pixelsInUnit * cmApart
@@ -78,10 +68,12 @@ def plotXSpeed(ax, df: pd.DataFrame, title: str):
     print("plotXSpeed done")
     return out
 
-def createAndSavePlots(args):
-    df, title, exportDir = args
-
-    fig, axs = plt.subplots(2, 1, figsize=(10, 10))
+def createAndSavePlots(df: pd.DataFrame, title: str, exportDir: str):
+    # Figure and its Agg canvas are used directly instead of pyplot,
+    # so this is safe to run from the analysis thread
+    fig = Figure(figsize=(10, 10))
+    FigureCanvasAgg(fig)
+    axs = fig.subplots(2, 1)
     plotXPos(axs[0], df, title + " Flame Leading Edge Position")
     plotXSpeed(axs[1], df, title + " Flame Leading Edge Speed")
 
@@ -105,73 +97,86 @@ def gatherStatistics(df: pd.DataFrame):
 
     return stats
 
-def postProcess(highestXPosList: list, boundingBoxWithSecondCropBox: list[list[np.int64]], config, title: str, exportDir: str, lowestXPos: list[int], flameTipCoordinates: list[int]):
+def postProcess(
+    results: ResultStore,
+    config,
+    title: str,
+    exportDir: str,
+    timer: StageTimer = None,
+    extraMetadata: dict = None,
+):
+    """
+    timer has the stage times of the analysis, if there was one.
+    The post processing stages are added to it and the summary goes into metadata.json
+    along with extraMetadata.
+    """
+    if timer is None:
+        timer = StageTimer()
+
     pixelsInUnit = config["pixelsInUnit"]
     cmApart = config["cmApart"]
     fps = config["fps"]
 
-    # Auto crop
-    print("auto crop")
-    highestXPosList, firstIndex, maxIndex = autoCrop(highestXPosList)
-
-    # Create dataframe
-    print("create dataframe")
-    df = highestXPosListToPd(highestXPosList)
-
-    boundingBoxWithSecondCropBox = boundingBoxWithSecondCropBox[firstIndex:maxIndex]
-    lowestXPos = lowestXPos[firstIndex:maxIndex]
-    flameTipCoordinates = flameTipCoordinates[firstIndex:maxIndex]
+    with timer.measure("postProcess"):
+        # Auto crop
+        print("auto crop")
+        _, firstIndex, maxIndex = autoCrop(results["highestXPos"])
 
-    # Create rows for bounding box
-    df['bbox_topleft_y'] = [x[0] for x in boundingBoxWithSecondCropBox]
-    df['bbox_bottomright_y'] = [x[1] for x in boundingBoxWithSecondCropBox]
-    df['bbox_topleft_x'] = [x[2] for x in boundingBoxWithSecondCropBox]
-    df['bbox_bottomright_x'] = [x[3] for x in boundingBoxWithSecondCropBox]
+        # Create dataframe, its columns are views of the results
+        print("create dataframe")
+        df = results.toDataFrame(firstIndex, maxIndex)
 
-    # Create row for lowestXPos
-    df['lowestXPos'] = lowestXPos
+        # Create seconds column
+        print("create seconds column")
+        createSecondsColumn(df, fps)
 
-    # Create rows for flameTipCoordinates
-    df['flameTip_x'] = [x[0] for x in flameTipCoordinates]
-    df['flameTip_y'] = [x[1] for x in flameTipCoordinates]
+        # Smoothen highestXPos
+        print("smoothen highestXPos")
+        smoothHighestXPos(df, "highestXPos", 50)
 
-    # Create seconds column
-    print("create seconds column")
-    createSecondsColumn(df, fps)
+        # Convert pixels to cm
+        print("convert pixels to cm", pixelsInUnit, cmApart)
+        convertPxToCm(df, "highestXPosSmooth", pixelsInUnit, cmApart)
 
-    # Smoothen highestXPos
-    print("smoothen highestXPos")
-    smoothHighestXPos(df, "highestXPos", 50)
+        # Measure speed
+        print("measure speed")
+        measureSpeed(df, "highestXPosSmoothCm")
 
-    # Convert pixels to cm
-    print("convert pixels to cm", pixelsInUnit, cmApart)
-    convertPxToCm(df, "highestXPosSmooth", pixelsInUnit, cmApart)
-
-    # Measure speed
-    print("measure speed")
-    measureSpeed(df, "highestXPosSmoothCm")
+        stats = gatherStatistics(df)
 
     # Export CSV
     print("exporting csv")
-    csvExportPath = os.path.join(exportDir, "highestXPos.csv")
-    df.to_csv(csvExportPath, mode="w")
+    with timer.measure("csv"):
+        csvExportPath = os.path.join(exportDir, "highestXPos.csv")
+        df.to_csv(csvExportPath, mode="w")
+
+    # Plotted before the metadata is written, so it has the plot time too
+    with timer.measure("plot"):
+        createAndSavePlots(df, title, exportDir)
 
     # Metadata
     metadata = {}
     metadata["config"] = config
-    metadata["highestXPosSmoothCmSpeedStats"] = gatherStatistics(df)
+    metadata["componentFilter"] = getComponentFilter(config)
+    metadata["highestXPosSmoothCmSpeedStats"] = stats
     metadata["title"] = title
     metadata["exportDir"] = exportDir
     metadata["version"] = _version.__version__
+    metadata["frames"] = len(results)
+    metadata["timings"] = timer.getSummary()
+    metadata.update(extraMetadata or {})
 
     # Export metadata into JSON
     print("exporting metadata")
 
+    metadataJson = json.dumps(metadata, cls=JSONEncoderCustom, indent=4)
+
     jsonExportPath = os.path.join(exportDir, "metadata.json")
     with open(jsonExportPath, 'w') as f:
-        json.dump(metadata, f, cls=JSONEncoderCustom, indent=4)
+        f.write(metadataJson)
 
-    # Matplotlib savefig doesn't work in a thread
-    # https://britishgeologicalsurvey.github.io/science/python-forking-vs-spawn/
-    with multiprocessing.get_context("spawn").Pool() as pool:
-        pool.map(createAndSavePlots, [(df, title, exportDir)])
\ No newline at end of file
+    # Optional Parquet/Feather copies of the CSV, with the metadata embedded
+    exportFormats = config.get("exportFormats", [])
+    if exportFormats:
+        print("exporting", ", ".join(exportFormats))
+        exportColumnar(df, metadataJson, exportDir, exportFormats)
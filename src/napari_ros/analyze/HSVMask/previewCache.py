@@ -0,0 +1,62 @@
+import numpy as np
+from ..._video import FrameCache
+from .HSVMaskAnalyzer import HSVMaskAnalyzer
+from .rgbToHsvLookup import rgb_to_flat_index
+
+# Memory budget of each preview stage
+DEFAULT_STAGE_BYTES = 256 * 1024 * 1024
+
+
+class PreviewCache:
+    """
+    Staged cache for the live preview, so a change only redoes the
+    stages that depend on it:
+        frame: decoded frame, keyed by frame number
+        rgbIndex: packed RGB index of the whole frame, keyed by frame number
+        mask: mask of the whole (unmirrored) frame, keyed by frame number and h, s, v
+    Crop and mirror are applied to the cached mask as views, so changing
+    them only recomputes the extents. Changing h, s or v reuses the decoded
+    frame and its RGB index. Each stage evicts least recently used entries
+    past maxBytes.
+    """
+
+    def __init__(self, analyzer: HSVMaskAnalyzer, maxBytes: int = DEFAULT_STAGE_BYTES):
+        self.analyzer = analyzer
+        self.frames = FrameCache(maxBytes)
+        self.rgbIndices = FrameCache(maxBytes)
+        self.masks = FrameCache(maxBytes)
+
+    def getFrame(self, layerData, frameNumber: int):
+        # The layer's array is part of the key in case the layer changes
+        key = (id(layerData), frameNumber)
+
+        frame = self.frames.get(key)
+        if frame is None:
+            frame = np.asarray(layerData[frameNumber, :, :, :])
+            self.frames.add(key, frame)
+
+        return frame
+
+    def getMask(self, layerData, frameNumber: int, h, s, v):
+        hsvKey = tuple(tuple(map(float, hsvRange)) for hsvRange in (h, s, v))
+        key = (id(layerData), frameNumber, hsvKey)
+
+        mask = self.masks.get(key)
+        if mask is not None:
+            return mask
+
+        frame = self.getFrame(layerData, frameNumber)
+
+        if frame.dtype == np.uint8 and frame.shape[-1] == 3:
+            indexKey = (id(layerData), frameNumber)
+            rgbIndex = self.rgbIndices.get(indexKey)
+            if rgbIndex is None:
+                rgbIndex = rgb_to_flat_index(frame)
+                self.rgbIndices.add(indexKey, rgbIndex)
+
+            mask = self.analyzer.getMaskFromRgbIndex(h, s, v, rgbIndex)
+        else:
+            mask = self.analyzer.getMask(h, s, v, frame)
+
+        self.masks.add(key, mask)
+        return mask
@@ -0,0 +1,177 @@
+import numpy as np
+
+from .roiPlanner import normalizeRegion
+
+
+def getBoxVertices(top, bottom, left, right):
+    return np.array(
+        [
+            [top, left],
+            [top, right],
+            [bottom, right],
+            [bottom, left],
+        ],
+        dtype=float,
+    )
+
+
+def getVerticalLineVertices(top, bottom, x):
+    return np.array([[top, x], [bottom, x]], dtype=float)
+
+
+class PreviewOverlays:
+    """
+    The preview overlay layers, created once and then updated in place.
+
+    The mask layer only holds the second crop box mask and is placed with
+    translate, instead of a full frame array. Shapes and points only get
+    new data when their vertices actually changed, so moving one slider
+    doesn't rebuild every layer.
+    """
+
+    def __init__(self, viewer):
+        self._viewer = viewer
+        self.layers = {}
+        self._vertices = {}
+
+    def _getLayer(self, name: str, addLayer):
+        layer = self.layers.get(name)
+
+        # Created on first use, or again if the user deleted it
+        if layer is None or layer not in self._viewer.layers:
+            layer = addLayer()
+            self.layers[name] = layer
+            self._vertices.pop(name, None)
+
+        return layer
+
+    def _updateMask(self, mask: np.ndarray, translate):
+        # bool and uint8 have the same size, so this is a view
+        maskData = mask.view(np.uint8)
+
+        layer = self._getLayer(
+            "Mask WITH SECOND CROP BOX",
+            lambda: self._viewer.add_image(
+                maskData,
+                name="Mask WITH SECOND CROP BOX",
+                colormap="green",
+                contrast_limits=[0, 1],
+                opacity=0.5,
+                translate=translate,
+            ),
+        )
+
+        if tuple(layer.translate) != tuple(translate):
+            layer.translate = translate
+        layer.data = maskData
+
+    def _updateShape(self, name: str, vertices: np.ndarray, **kwargs):
+        layer = self._getLayer(
+            name, lambda: self._viewer.add_shapes([vertices], name=name, **kwargs)
+        )
+
+        # Skip when nothing moved
+        previous = self._vertices.get(name)
+        if previous is not None and np.array_equal(previous, vertices):
+            return
+
+        if previous is not None:
+            layer.data = [vertices]
+        self._vertices[name] = vertices
+
+    def _updatePoint(self, name: str, point: np.ndarray, **kwargs):
+        layer = self._getLayer(
+            name, lambda: self._viewer.add_points(point, name=name, **kwargs)
+        )
+
+        previous = self._vertices.get(name)
+        if previous is not None and np.array_equal(previous, point):
+            return
+
+        if previous is not None:
+            layer.data = point
+        self._vertices[name] = point
+
+    def update(self, preview: dict):
+        """
+        Update the overlays from a result yielded by the preview worker
+        """
+        frameHeight, frameWidth = preview["frameShape"]
+        crop = normalizeRegion(preview["crop"], (frameHeight, frameWidth))
+        secondCropBox = normalizeRegion(
+            preview["secondCropBox"], (frameHeight, frameWidth)
+        )
+        boundingBox = preview["boundingBoxWithSecondCropBox"]
+        flameTip = preview["flameTipCoordinates"]
+
+        # Mask of the second crop box, placed at its top left corner
+        self._updateMask(
+            preview["maskWithSecondCropBox"], (secondCropBox[0], secondCropBox[2])
+        )
+
+        # Box around the crop WITH SECOND CROP BOX
+        self._updateShape(
+            "Crop ONLY X",
+            getBoxVertices(*secondCropBox),
+            edge_color="grey",
+            face_color="transparent",
+            edge_width=2,
+            opacity=1,
+        )
+
+        # Box around the crop
+        self._updateShape(
+            "Crop",
+            getBoxVertices(*crop),
+            edge_color="white",
+            face_color="transparent",
+            edge_width=2,
+            opacity=1,
+        )
+
+        # Red line at the highest X pos
+        self._updateShape(
+            "Highest X Pos",
+            getVerticalLineVertices(crop[0], frameHeight, preview["highestXPos"] + crop[2]),
+            shape_type="line",
+            edge_color="red",
+            edge_width=5,
+            opacity=1,
+        )
+
+        # Blue box around the bounding box WITH SECOND CROP BOX offset
+        self._updateShape(
+            "Bounding Box WITH SECOND CROP BOX",
+            getBoxVertices(
+                boundingBox[0] + secondCropBox[0],
+                boundingBox[1] + secondCropBox[0],
+                boundingBox[2] + secondCropBox[2],
+                boundingBox[3] + secondCropBox[2],
+            ),
+            edge_color="blue",
+            face_color="transparent",
+            edge_width=2,
+            opacity=1,
+        )
+
+        # Magenta line at the lowest X pos
+        self._updateShape(
+            "Lowest X Pos",
+            getVerticalLineVertices(crop[0], frameHeight, preview["lowestXPos"] + crop[2]),
+            shape_type="line",
+            edge_color="magenta",
+            edge_width=5,
+            opacity=1,
+        )
+
+        # Purple point at the flame tip
+        self._updatePoint(
+            "Flame Tip",
+            np.array(
+                [[flameTip[1] + secondCropBox[0], flameTip[0] + secondCropBox[2]]],
+                dtype=float,
+            ),
+            face_color="purple",
+            size=20,
+            opacity=1,
+        )
@@ -0,0 +1,58 @@
+import threading
+import time
+
+
+class PreviewScheduler:
+    """
+    Hands preview requests from the widget to the preview worker.
+
+    Only the newest request is kept: anything submitted while the worker
+    is busy replaces the pending request, so a burst of slider ticks or
+    frame changes runs once with the latest (config, frame) pair.
+    Every request is stamped so the worker can drop it as soon as a newer
+    one arrives, and so the widget can measure slider to overlay latency.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = None
+        self._generation = 0
+        self._closed = False
+
+    def submit(self, request: dict):
+        with self._condition:
+            self._generation += 1
+            request["generation"] = self._generation
+            request["submittedAt"] = time.perf_counter()
+
+            self._pending = request
+            self._condition.notify()
+
+    def waitForRequest(self):
+        """
+        Wait for the next request. Returns None once the scheduler is closed.
+        """
+        with self._condition:
+            while self._pending is None and not self._closed:
+                self._condition.wait()
+
+            if self._closed:
+                return None
+
+            request = self._pending
+            self._pending = None
+            return request
+
+    def isStale(self, request: dict):
+        """
+        True when a newer request has been submitted since this one
+        """
+        return request["generation"] != self._generation
+
+    def getLatencyMs(self, request: dict):
+        return (time.perf_counter() - request["submittedAt"]) * 1000
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
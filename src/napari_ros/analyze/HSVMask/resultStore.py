@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+# Frames added to the capacity at a time, at least
+BLOCK_FRAMES = 4096
+
+# Columns of the exported data, in order
+BOUNDING_BOX_COLUMNS = ["bbox_topleft_y", "bbox_bottomright_y", "bbox_topleft_x", "bbox_bottomright_x"]
+FLAME_TIP_COLUMNS = ["flameTip_x", "flameTip_y"]
+RESULT_COLUMNS = ["highestXPos", *BOUNDING_BOX_COLUMNS, "lowestXPos", *FLAME_TIP_COLUMNS]
+
+
+class ResultStore:
+    """
+    Per-frame analysis results, one int64 array per exported column.
+    The arrays are preallocated and grown in blocks as chunks of results
+    are appended, and toDataFrame hands views of them to pandas, so no
+    Python object is created per frame.
+    """
+
+    def __init__(self, capacity: int = BLOCK_FRAMES):
+        self.length = 0
+        self._columns = {
+            name: np.empty(capacity, dtype=np.int64) for name in RESULT_COLUMNS
+        }
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def capacity(self):
+        return len(self._columns["highestXPos"])
+
+    def reserve(self, frames: int):
+        """
+        Make room for frames more results
+        """
+        needed = self.length + frames
+        if needed <= self.capacity:
+            return
+
+        # Doubling keeps appending linear, rounded up to whole blocks
+        capacity = max(needed, self.capacity * 2)
+        capacity = -(-capacity // BLOCK_FRAMES) * BLOCK_FRAMES
+
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self.length] = column[: self.length]
+            self._columns[name] = grown
+
+    def append(self, results):
+        """
+        Append the columnar results of HSVMaskAnalyzer.analyzeFrames
+        """
+        frames = len(results["highestXPos"])
+        self.reserve(frames)
+        rows = slice(self.length, self.length + frames)
+
+        self._columns["highestXPos"][rows] = results["highestXPos"]
+        self._columns["lowestXPos"][rows] = results["lowestXPos"]
+
+        boundingBox = np.asarray(results["boundingBoxWithSecondCropBox"]).reshape(frames, 4)
+        for i, name in enumerate(BOUNDING_BOX_COLUMNS):
+            self._columns[name][rows] = boundingBox[:, i]
+
+        flameTip = np.asarray(results["flameTipCoordinates"]).reshape(frames, 2)
+        for i, name in enumerate(FLAME_TIP_COLUMNS):
+            self._columns[name][rows] = flameTip[:, i]
+
+        self.length += frames
+
+    def appendEmpty(self, frames: int):
+        """
+        Append frames without flame, all 0 like an empty mask
+        """
+        self.reserve(frames)
+        for column in self._columns.values():
+            column[self.length : self.length + frames] = 0
+        self.length += frames
+
+    def __getitem__(self, name: str):
+        return self._columns[name][: self.length]
+
+    def toDataFrame(self, start: int = 0, stop: int = None):
+        """
+        DataFrame of frames start to stop, with a frame column counting from 1.
+        The result columns are views of the store, not copies.
+        """
+        start, stop, _ = slice(start, stop).indices(self.length)
+
+        columns = {"frame": np.arange(1, stop - start + 1)}
+        for name in RESULT_COLUMNS:
+            columns[name] = self[name][start:stop]
+
+        return pd.DataFrame(columns, copy=False)
@@ -1,11 +1,98 @@
+import os
 import numpy as np
+from numpy.lib.format import open_memmap
+from skimage.color import rgb2hsv
 
+LOOKUP_FILENAME = "rgbToHsv.npy"
 
-def load_rgb_to_hsv_lookup():
+# Lookups that have already been opened in this process, keyed by path
+_loadedLookups = {}
+
+
+def get_cache_dir():
+    """
+    Directory where precomputed lookup tables are stored.
+    Can be changed with the NAPARI_ROS_CACHE_DIR environment variable.
+    """
+    return os.environ.get(
+        "NAPARI_ROS_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "napari-ros"),
+    )
+
+
+def create_rgb_to_hsv_lookup(path: str):
     """
-    See `notebooks/createRgbToHsvLookup.ipynb`
+    Precompute the HSV value of every 24-bit RGB colour and save it to path.
+    The table is shaped (256, 256, 256, 3) and indexed with [r, g, b].
+
+    Every slice is converted with skimage's rgb2hsv, so looking up a
+    colour gives exactly the same float64 values as converting it directly.
+    Replaces `notebooks/createRgbToHsvLookup.ipynb`.
     """
-    # Load the lookup table from a file
-    return np.load(
-        "/Users/kyle/Documents/Projects/napari-ros/src/napari_ros/precomputed/rgbToHsv.npy"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write to a temporary file first so other processes never
+    # open a half written table
+    tmpPath = f"{path}.{os.getpid()}.tmp"
+    lookup = open_memmap(
+        tmpPath, mode="w+", dtype=np.float64, shape=(256, 256, 256, 3)
+    )
+
+    # Every (g, b) pair, reused for each red value
+    g, b = np.meshgrid(
+        np.arange(256, dtype=np.uint8),
+        np.arange(256, dtype=np.uint8),
+        indexing="ij",
     )
+    rgbSlice = np.stack([np.zeros_like(g), g, b], axis=-1)
+
+    for r in range(256):
+        rgbSlice[:, :, 0] = r
+        lookup[r] = rgb2hsv(rgbSlice)
+
+    lookup.flush()
+    del lookup
+
+    os.replace(tmpPath, path)
+
+
+def load_rgb_to_hsv_lookup(cacheDir: str = None):
+    """
+    Memory-map the RGB to HSV lookup table, building it first if
+    it is not in the cache directory yet.
+    """
+    if cacheDir is None:
+        cacheDir = get_cache_dir()
+
+    path = os.path.join(cacheDir, LOOKUP_FILENAME)
+
+    if path in _loadedLookups:
+        return _loadedLookups[path]
+
+    if not os.path.exists(path):
+        print(f"building RGB to HSV lookup table at {path}")
+        create_rgb_to_hsv_lookup(path)
+
+    lookup = np.load(path, mmap_mode="r")
+    _loadedLookups[path] = lookup
+
+    return lookup
+
+
+def rgb_to_flat_index(frame: np.ndarray):
+    """
+    Pack a uint8 RGB frame into one 24-bit index per pixel,
+    (r << 16) | (g << 8) | b, matching the flattened lookup table.
+    """
+    index = frame[..., 0].astype(np.uint32) << 16
+    index |= frame[..., 1].astype(np.uint32) << 8
+    index |= frame[..., 2]
+    return index
+
+
+def rgb_to_hsv(frame: np.ndarray, lookup: np.ndarray):
+    """
+    Convert a uint8 RGB frame to HSV scaled 0 to 1 with a single gather
+    from the lookup table. Same output as skimage's rgb2hsv.
+    """
+    return np.take(lookup.reshape(-1, 3), rgb_to_flat_index(frame), axis=0)
@@ -0,0 +1,82 @@
+from typing import List, Tuple
+
+# [top, bottom, left, right], clipped to the frame
+Region = Tuple[int, int, int, int]
+
+
+def normalizeRegion(region: List[int], frameShape: Tuple[int, int]) -> Region:
+    """
+    Clip a [top, bottom, left, right] region to the frame the same way
+    numpy slicing does, so frame[top:bottom, left:right] keeps its shape.
+    """
+    top, bottom, _ = slice(region[0], region[1]).indices(frameShape[0])
+    left, right, _ = slice(region[2], region[3]).indices(frameShape[1])
+
+    return top, max(top, bottom), left, max(left, right)
+
+
+def regionArea(region: Region):
+    return (region[1] - region[0]) * (region[3] - region[2])
+
+
+def boundingRegion(regions: List[Region]) -> Region:
+    return (
+        min(region[0] for region in regions),
+        max(region[1] for region in regions),
+        min(region[2] for region in regions),
+        max(region[3] for region in regions),
+    )
+
+
+def planRegions(regions: List[Region]):
+    """
+    Group normalized regions so each group only has to be thresholded once,
+    over its bounding box. Regions are merged as long as the bounding box
+    has no more pixels than thresholding them separately would.
+    Returns a list of (boundingRegion, [indices into regions]).
+    """
+    groups = []
+
+    for i, region in enumerate(regions):
+        # Empty regions keep their own (empty) group so their shape is kept
+        if regionArea(region) == 0:
+            groups.append((region, [i]))
+            continue
+
+        for groupIdx, (groupRegion, indices) in enumerate(groups):
+            if regionArea(groupRegion) == 0:
+                continue
+
+            merged = boundingRegion([groupRegion, region])
+            if regionArea(merged) <= regionArea(groupRegion) + regionArea(region):
+                groups[groupIdx] = (merged, indices + [i])
+                break
+        else:
+            groups.append((region, [i]))
+
+    return groups
+
+
+def getSourceSlices(region: Region, frameWidth: int, mirror: bool):
+    """
+    Row and column slices into the original frame that cover a region
+    given in (possibly mirrored) frame coordinates. When mirrored, the
+    slice still has to be flipped horizontally.
+    """
+    top, bottom, left, right = region
+
+    if mirror:
+        left, right = frameWidth - right, frameWidth - left
+
+    return slice(top, bottom), slice(left, right)
+
+
+def getRegionSlices(arrayRegion: Region, region: Region):
+    """
+    Row and column slices that cut region out of an array covering
+    arrayRegion. Slicing with them gives a zero-copy view.
+    """
+    return (
+        slice(region[0] - arrayRegion[0], region[1] - arrayRegion[0]),
+        slice(region[2] - arrayRegion[2], region[3] - arrayRegion[2]),
+    )
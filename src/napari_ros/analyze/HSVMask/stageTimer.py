@@ -0,0 +1,52 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class StageTimer:
+    """
+    Wall time and number of calls accumulated per named stage.
+    Stages are timed per frame or per chunk, never per pixel, so it costs
+    a couple of microseconds per measurement and stays on all the time.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+
+    def add(self, stage: str, seconds: float, calls: int = 1):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def merge(self, summary: dict):
+        """
+        Add a summary from getSummary, e.g. one sent back by a worker process
+        """
+        for stage, timing in summary.items():
+            self.add(stage, timing["seconds"], timing["calls"])
+
+    def getSummary(self):
+        return {
+            stage: {
+                "seconds": seconds,
+                "calls": self.calls[stage],
+                "msPerCall": seconds / self.calls[stage] * 1000,
+            }
+            for stage, seconds in self.seconds.items()
+        }
+
+
+def measureStage(timer: StageTimer, stage: str):
+    """
+    timer.measure(stage), or nothing when there is no timer
+    """
+    if timer is None:
+        return nullcontext()
+    return timer.measure(stage)
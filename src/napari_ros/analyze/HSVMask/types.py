@@ -1,15 +1,32 @@
-from typing import TypedDict
-from napari.layers import Layer
+from typing import TYPE_CHECKING, TypedDict
+
+# Only for the annotation, so the batch analysis doesn't need napari
+if TYPE_CHECKING:
+    from napari.layers import Layer
 
 
 class HSVMaskConfigType(TypedDict):
-    layer: Layer
+    layer: "Layer"
     crop: "list[int]"
     secondCropBox: "list[int]"
     mirror: bool
     h: "list[float, float]"
     s: "list[float, float]"
     v: "list[float, float]"
+    minComponentArea: int  # flame specks with fewer pixels are ignored, 0 keeps everything
+    keepLargestComponent: bool  # only the largest flame is kept
     pixelsInUnit: int
     cmApart: float
     fps: float
+    workers: int  # analysis processes, 1 analyzes in the napari thread
+    chunkSize: int  # frames sent to a worker process at a time
+    exportFormats: "list[str]"  # "parquet" and/or "feather", written next to the CSV
+    adaptiveSampling: bool  # only analyze from ignition to the end of the burn
+    samplingProbes: int  # frames looked at to find them
+    samplingFlatStep: int  # > 1 skips frames where nothing moved, approximate
+    frontTracking: bool  # only threshold the columns around the last frame's flame, approximate
+    trackingMargin: int  # pixels the band reaches past the flame on each side
+    trackingRefreshFrames: int  # a frame this often is still analyzed at full width, 0 for never
+    coarseToFine: bool  # only threshold the tiles that can change the extents, same results
+    coarseTileSize: int  # pixels per side of those tiles
+    maskArchive: bool  # keep every frame's masks, bit-packed in masks.bin next to the CSV
@@ -0,0 +1,120 @@
+"""
+napari-ros command line, for running analyses without napari.
+
+    napari-ros analyze "burns/*.mp4" burns/DSC_0042 --config napari_ros_last_config.json --workers 4
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import traceback
+
+from .analyze.HSVMask.batchAnalysis import loadConfig, runAnalysis
+
+
+def expandInputs(patterns: list):
+    """
+    Expand glob patterns (for shells that don't), keeping order and
+    dropping duplicates
+    """
+    inputPaths = []
+
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            print(f"warning: {pattern} matched nothing", file=sys.stderr)
+
+        for inputPath in matches:
+            inputPath = os.path.normpath(inputPath)
+            if inputPath not in inputPaths:
+                inputPaths.append(inputPath)
+
+    return inputPaths
+
+
+def analyzeOne(args):
+    """
+    Runs in a worker process. Returns (inputPath, error or None)
+    so one broken input doesn't stop the others.
+    """
+    inputPath, config = args
+
+    try:
+        runAnalysis(inputPath, config)
+        return inputPath, None
+    except Exception:  # noqa: BLE001 any error only fails this input, it is reported at the end
+        return inputPath, traceback.format_exc()
+
+
+def analyzeCommand(args):
+    config = loadConfig(args.config)
+    inputPaths = expandInputs(args.inputs)
+
+    if not inputPaths:
+        print("nothing to analyze", file=sys.stderr)
+        return 1
+
+    missing = [inputPath for inputPath in inputPaths if not os.path.exists(inputPath)]
+    if missing:
+        print(f"not found: {', '.join(missing)}", file=sys.stderr)
+        return 1
+
+    if args.workers > 1 and len(inputPaths) > 1:
+        # One input per process. Worker processes can't start their own
+        # pools, so every input is analyzed in its process alone
+        config = {**config, "workers": 1}
+
+        with multiprocessing.get_context("spawn").Pool(
+            min(args.workers, len(inputPaths))
+        ) as pool:
+            results = list(
+                pool.imap_unordered(
+                    analyzeOne, [(inputPath, config) for inputPath in inputPaths]
+                )
+            )
+    else:
+        # A single input can still spread its frames over the processes
+        if args.workers > 1:
+            config = {**config, "workers": args.workers}
+
+        results = [analyzeOne((inputPath, config)) for inputPath in inputPaths]
+
+    failed = [(inputPath, error) for inputPath, error in results if error is not None]
+    for inputPath, error in failed:
+        print(f"[{inputPath}] failed:\n{error}", file=sys.stderr)
+
+    print(f"{len(results) - len(failed)} of {len(results)} analyzed")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="napari-ros")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    analyzeParser = subparsers.add_parser(
+        "analyze",
+        help="analyze image sequence directories and videos, results go to data/<title> next to each",
+    )
+    analyzeParser.add_argument(
+        "inputs", nargs="+", help="image sequence directories or videos, globs are expanded"
+    )
+    analyzeParser.add_argument(
+        "--config",
+        required=True,
+        help="config JSON in the napari_ros_last_config.json format",
+    )
+    analyzeParser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="inputs analyzed at the same time, each in its own process (default 1)",
+    )
+    analyzeParser.set_defaults(run=analyzeCommand)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())